@@ -0,0 +1,234 @@
+'''
+@company USC ETSE
+@description Medir el tiempo y el pico de memoria de la lectura, de cada consulta y de cada grafica con ficheros sinteticos
+            (generador.py) de distintos tamaños, y guardar los resultados en un fichero para poder comparar versiones.
+'''
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import generador
+
+# Tamaños de los ficheros por defecto (numero de alojamientos)
+TAMANOS = [10000, 100000, 1000000, 10000000]
+
+# Fichero donde se añaden los resultados, un json por linea
+RESULTADOS = 'benchmark_resultados.jsonl'
+
+# Distritos que se usan en las consultas y graficas por distritos
+DISTRITOS = ['Centro', 'Villaverde', 'Vicálvaro']
+
+# Punto en el que se centran las consultas de la rejilla (Puerta del Sol)
+CENTRO = (40.4168, -3.7038)
+
+'''
+@param string ruta: ruta del fichero de alojamientos
+@param string caso: nombre del caso
+@description Prepara lo que necesita cada caso (sin medirlo). Como la tabla de functions.py guarda los conteos y el indice
+            ya calculados, cada repeticion trabaja con una tabla nueva para que siempre se mida el calculo y no la cache
+@return funcion sin argumentos que se llama antes de cada repeticion (sin medirla) y devuelve la funcion que se mide
+'''
+def _preparar(ruta, caso):
+    import functions
+    import functionsPandas
+
+    grupo, nombre = caso.split('.')
+
+    if grupo == 'carga':
+        return lambda: {
+            'preprocesar': lambda: functionsPandas.preprocesar(ruta),
+            'cache': lambda: functionsPandas.cargarAlojamientos(ruta),
+            'leerTabla': lambda: functions.leerTabla(ruta),
+            'leerLista': lambda: [alojamiento for bloque in functions.leerAlojamientos(ruta) for alojamiento in bloque]
+        }[nombre]
+
+    if grupo == 'tabla':
+        leida = functions.leerTabla(ruta)
+
+        def repeticion():
+            # Tabla con los mismos arrays pero sin conteos ni indice
+            tabla = functions.TablaAlojamientos(leida.ids, leida.anfitriones, leida.distritos, leida.nombresDistritos,
+                                                leida.precios, leida.plazas)
+            return {
+                'alojamientosDistritos': lambda: functions.alojamientosDistritos(tabla),
+                'disponibilidadAlojamiento': lambda: functions.disponibilidadAlojamiento(tabla, 4),
+                'alojamientosBaratos': lambda: functions.alojamientosBaratos(tabla, DISTRITOS[0], 10),
+                'landlords': lambda: functions.landlords(tabla)
+            }[nombre]
+
+        return repeticion
+
+    if grupo == 'lista':
+        lista = [alojamiento for bloque in functions.leerAlojamientos(ruta) for alojamiento in bloque]
+        return lambda: {
+            'alojamientosDistritos': lambda: functions.alojamientosDistritos(lista),
+            'disponibilidadAlojamiento': lambda: functions.disponibilidadAlojamiento(lista, 4),
+            'alojamientosBaratos': lambda: functions.alojamientosBaratos(lista, DISTRITOS[0], 10),
+            'landlords': lambda: functions.landlords(lista)
+        }[nombre]
+
+    data = functionsPandas.cargarAlojamientos(ruta)
+
+    if grupo == 'pandas':
+        # Los idiomas se detectan sin cache para medir siempre la deteccion, y puntuacionOperadores los recibe ya detectados
+        idiomas = functionsPandas.idiomasNombres(data, rutaCache = None) if nombre == 'puntuacionOperadores' else None
+
+        return lambda: {
+            'tiposAlojamientoDistrito': lambda: functionsPandas.tiposAlojamientoDistrito(data, DISTRITOS),
+            'alojamientosPropietariosDistritos': lambda: functionsPandas.alojamientosPropietariosDistritos(data, DISTRITOS),
+            'mediaAlojamientosDistrito': lambda: functionsPandas.mediaAlojamientosDistrito(data),
+            'EstadisticasDistritos': lambda: functionsPandas.EstadisticasDistritos(data),
+            'IndiceAlojamientos': lambda: functionsPandas.IndiceAlojamientos(data),
+            'concentracionDistritos': lambda: functionsPandas.concentracionDistritos(data),
+            'idiomasNombres': lambda: functionsPandas.idiomasNombres(data, rutaCache = None),
+            'puntuacionOperadores': lambda: functionsPandas.puntuacionOperadores(data, idiomas),
+            'RejillaAlojamientos': lambda: functionsPandas.RejillaAlojamientos(data)
+        }[nombre]
+
+    if grupo == 'rejilla':
+        rejilla = functionsPandas.RejillaAlojamientos(data)
+        return lambda: {
+            'radio': lambda: rejilla.radio(*CENTRO, 500),
+            'cercanos': lambda: rejilla.cercanos(*CENTRO, 10)
+        }[nombre]
+
+    # Las graficas se dibujan en una carpeta temporal y se borra el hash antes de cada repeticion para que se dibujen siempre
+    carpeta = tempfile.mkdtemp()
+    png = os.path.join(carpeta, nombre + '.png')
+    funcion = getattr(functionsPandas, nombre)
+    argumentos = (data, DISTRITOS) if nombre in ('diagramaPieTipos', 'diagramaDispersionCosteMin') else (data,)
+
+    def repeticion():
+        if os.path.exists(png + '.hash'):
+            os.remove(png + '.hash')
+        return lambda: funcion(*argumentos, ruta = png)
+
+    return repeticion
+
+# Casos que se miden, con el formato grupo.nombre
+CASOS = ['carga.preprocesar', 'carga.cache', 'carga.leerTabla', 'carga.leerLista',
+         'tabla.alojamientosDistritos', 'tabla.disponibilidadAlojamiento', 'tabla.alojamientosBaratos', 'tabla.landlords',
+         'lista.alojamientosDistritos', 'lista.disponibilidadAlojamiento', 'lista.alojamientosBaratos', 'lista.landlords',
+         'pandas.tiposAlojamientoDistrito', 'pandas.alojamientosPropietariosDistritos', 'pandas.mediaAlojamientosDistrito',
+         'pandas.EstadisticasDistritos', 'pandas.IndiceAlojamientos', 'pandas.concentracionDistritos', 'pandas.idiomasNombres',
+         'pandas.puntuacionOperadores', 'pandas.RejillaAlojamientos', 'rejilla.radio', 'rejilla.cercanos',
+         'grafica.diagramaPieTipos', 'grafica.NumAlojamientosDistrito', 'grafica.diagramaBarrasDistrito',
+         'grafica.diagramaBarrasPrecioPersona', 'grafica.diagramaDispersionCosteMin', 'grafica.diagramaDensidad']
+
+'''
+@description Vuelve a empezar a contar el pico de memoria residente del proceso desde la memoria actual (solo en Linux,
+            escribiendo 5 en /proc/self/clear_refs)
+@return si se ha podido reiniciar
+'''
+def _reiniciarPico():
+    try:
+        with open('/proc/self/clear_refs', 'w') as fichero:
+            fichero.write('5')
+        return True
+    except OSError:
+        return False
+
+'''
+@return pico de memoria residente del proceso en MB desde el ultimo _reiniciarPico, o None si no se puede leer
+'''
+def _picoMemoria():
+    try:
+        with open('/proc/self/status') as fichero:
+            for linea in fichero:
+                if linea.startswith('VmHWM:'):
+                    return int(linea.split()[1]) / 2**10
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+'''
+@param string ruta: ruta del fichero de alojamientos
+@param string caso: nombre del caso
+@param int repeticiones: numero de veces que se ejecuta el caso
+@description Mide un caso en un proceso nuevo. Antes de cada repeticion se prepara de nuevo el caso (sin medirlo), y la
+            memoria que se guarda es lo que sube el pico de memoria residente durante la llamada respecto a la memoria que
+            habia justo antes, asi no cuenta lo que ocupan los imports ni los datos ya leidos
+@return el tiempo de la primera repeticion (que incluye los imports que se hacen al usar la funcion por primera vez), el
+        menor tiempo de las repeticiones en segundos y el mayor pico de memoria de las repeticiones en MB
+'''
+def _medir(ruta, caso, repeticiones):
+    from instrumentacion import memoriaResidente
+
+    nuevo = _preparar(ruta, caso)
+
+    tiempos, memorias = [], []
+    for _ in range(repeticiones):
+        funcion = nuevo()
+
+        antes, reiniciado = memoriaResidente(), _reiniciarPico()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+        pico = _picoMemoria()
+
+        if antes is not None and reiniciado and pico is not None:
+            memorias.append(round(max(pico - antes, 0), 1))
+
+    return tiempos[0], min(tiempos), max(memorias) if memorias else None
+
+'''
+@return el commit actual del repositorio, o None si no se puede saber
+'''
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output = True, text = True,
+                              cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+'''
+@param tamanos: lista con el numero de alojamientos de cada fichero
+@param casos: lista con los casos a medir
+@param int repeticiones: numero de veces que se ejecuta cada caso (se guarda el menor tiempo)
+@param string carpeta: carpeta donde se guardan los ficheros generados, si ya existen no se vuelven a generar
+@param string resultados: fichero donde se añaden los resultados
+@description Genera un fichero sintetico de cada tamaño y mide cada caso en un proceso nuevo. Cada resultado se añade como
+            una linea json con la fecha, el commit, el tamaño, el caso, el menor tiempo en segundos, el tiempo de la
+            primera repeticion y lo que sube el pico de memoria durante la llamada en MB
+@return lista con los resultados
+'''
+def ejecutarBenchmark(tamanos = TAMANOS, casos = CASOS, repeticiones = 3, carpeta = 'benchmark_datos', resultados = RESULTADOS):
+
+    os.makedirs(carpeta, exist_ok = True)
+    commit, fecha = _commit(), time.strftime('%Y-%m-%dT%H:%M:%S')
+    medidas = []
+
+    for tamano in tamanos:
+        ruta = os.path.join(carpeta, 'alojamientos-%d.csv' % tamano)
+        if not os.path.exists(ruta):
+            generador.generarFichero(ruta, tamano)
+
+        # La cache se genera antes para que carga.cache mida la lectura de la cache y no la del fichero
+        with ProcessPoolExecutor(max_workers = 1, mp_context = get_context('spawn')) as pool:
+            pool.submit(_medir, ruta, 'carga.cache', 1).result()
+
+        for caso in casos:
+            with ProcessPoolExecutor(max_workers = 1, mp_context = get_context('spawn')) as pool:
+                primera, segundos, memoria = pool.submit(_medir, ruta, caso, repeticiones).result()
+
+            medida = {'fecha': fecha, 'commit': commit, 'filas': tamano, 'caso': caso, 'segundos': round(segundos, 6),
+                      'primera_segundos': round(primera, 6), 'memoria_mb': memoria, 'repeticiones': repeticiones}
+            medidas.append(medida)
+
+            with open(resultados, 'a') as fichero:
+                fichero.write(json.dumps(medida, ensure_ascii = False) + '\n')
+
+            print('%10d %-45s %10.4f s (primera %.4f s) %10s MB' % (tamano, caso, segundos, primera, memoria))
+
+    return medidas
+
+if __name__ == '__main__':
+    # python benchmark.py [tamaño ...]
+    ejecutarBenchmark([int(tamano) for tamano in sys.argv[1:]] or TAMANOS)
@@ -0,0 +1,201 @@
+'''
+@company USC ETSE
+@description Lectura de los precios ($1,234.00) y calculo de los costes de una estancia minima, compartido por
+            functions.py y functionsPandas.py. Los precios de muchas filas se convierten a la vez trabajando directamente
+            con los bytes del texto, y los ficheros que no caben en memoria se pueden procesar por bloques. pandas solo se
+            importa en las funciones que lo usan, asi que functions.py puede usar parsearPrecio sin cargarlo.
+'''
+
+import re
+import sys
+
+import numpy as np
+
+# Columnas del fichero que hacen falta para los costes
+COLUMNAS_COSTES = ['id', 'price', 'cleaning_fee', 'minimum_nights', 'accommodates']
+
+# Forma de un precio valido: un $ opcional, cifras con comas de separador de miles y como mucho un punto decimal
+_FORMATO = re.compile(r'\$?[0-9,]*\.?[0-9]*')
+
+# Codigos ASCII que se usan al leer los precios
+_CERO, _NUEVE, _PUNTO, _COMA, _DOLAR = ord('0'), ord('9'), ord('.'), ord(','), ord('$')
+
+# Un int64 solo tiene sitio para 18 cifras seguras, los precios con mas cifras se toman como no validos
+_MAX_CIFRAS = 18
+
+'''
+@param string texto: precio tal y como viene en el fichero ($1,234.00)
+@description Convierte un precio a float quitando el simbolo del dolar y el separador de miles. Si la celda esta vacia o
+            no tiene la forma de un precio (por ejemplo -$5.00, $1.2.3 o con mas de _MAX_CIFRAS cifras) devuelve None,
+            en los mismos casos en los que parsearPrecios deja NaN
+'''
+def parsearPrecio(texto):
+    if not texto or not _FORMATO.fullmatch(texto):
+        return None
+
+    # Igual que en parsearPrecios, sin cifras o con mas de _MAX_CIFRAS cifras no es un precio valido
+    numCifras = len(texto) - texto.count('$') - texto.count(',') - texto.count('.')
+    if numCifras == 0 or numCifras > _MAX_CIFRAS:
+        return None
+
+    return float(texto.replace('$', '').replace(',', ''))
+
+'''
+@param mascara: array booleano con una fila por posicion del texto y una columna por precio
+@return array en el que cada posicion es True si en esa posicion o en alguna anterior del mismo precio la mascara es True
+        (como np.logical_or.accumulate por filas, pero fila a fila es mucho mas rapido)
+'''
+def _acumulado(mascara):
+    acumulado = mascara.copy()
+
+    for fila in range(1, len(acumulado)):
+        acumulado[fila] |= acumulado[fila - 1]
+
+    return acumulado
+
+'''
+@param valores: array, lista o serie con los precios en texto ($1,234.00) o en bytes
+@description Convierte muchos precios a la vez sin recorrerlos uno a uno. Los precios se pasan a un array de bytes de
+            ancho fijo y se ve cada precio como una fila de bytes: el $ y las comas se ignoran, las cifras se juntan en un
+            entero y se divide entre 10 elevado al numero de decimales. Cada byte se comprueba ademas contra la forma de
+            un precio (la misma que en parsearPrecio), asi que las celdas vacias, sin ninguna cifra o que no son un
+            precio (-$5.00, $1.2.3, €12,00...) se quedan como NaN
+@return array de float64 con los precios
+'''
+def parsearPrecios(valores):
+    import pandas as pd
+
+    if isinstance(valores, pd.Series):
+        valores = valores.to_numpy(dtype = object)
+
+    # Los NaN se pasan a texto vacio para que no se lean como b'nan'
+    valores = np.asarray(valores, dtype = object)
+    valores = np.where(pd.isna(valores), '', valores)
+
+    # Los precios validos son ASCII. Si hay alguna celda que no lo es, sus caracteres se cambian por ? y la celda queda
+    # como no valida
+    try:
+        valores = valores.astype('S')
+    except UnicodeEncodeError:
+        valores = np.char.encode(valores.astype('U'), 'ascii', 'replace')
+
+    n, ancho = len(valores), valores.dtype.itemsize
+    if n == 0 or ancho == 0:
+        return np.full(n, np.nan)
+
+    # Cada fila de bytesPrecios es una posicion del texto (tantas como caracteres tiene el precio mas largo) y cada columna un
+    # precio, asi cada operacion se hace a la vez para todos los precios. Los precios mas cortos se rellenan con bytes 0
+    bytesPrecios = np.ascontiguousarray(valores.view(np.uint8).reshape(n, ancho).T)
+
+    cifras = bytesPrecios - np.uint8(_CERO)
+    esCifra = cifras < 10
+    puntos = bytesPrecios == _PUNTO
+    comas = bytesPrecios == _COMA
+    relleno = bytesPrecios == 0
+    trasPunto = _acumulado(puntos)
+
+    # El $ solo puede ir al principio, las comas antes del punto y solo puede haber un punto; cualquier otro byte (o un
+    # byte despues del relleno) hace que el precio no sea valido
+    permitido = esCifra | puntos | comas | relleno
+    permitido[0] |= bytesPrecios[0] == _DOLAR
+
+    valido = permitido.all(axis = 0) & (puntos.sum(axis = 0) <= 1) & ~(comas & trasPunto).any(axis = 0)
+    valido &= ~(_acumulado(relleno) & ~relleno).any(axis = 0)
+
+    numCifras = esCifra.sum(axis = 0)
+    numDecimales = (esCifra & trasPunto).sum(axis = 0)
+
+    # Las cifras se van juntando en un entero (123400 para $1,234.00), el $, las comas y el punto se saltan
+    entero = np.zeros(n, dtype = 'int64')
+    for cifra, hayCifra in zip(cifras, esCifra):
+        entero = np.where(hayCifra, entero * 10 + cifra, entero)
+
+    # Dividiendo el entero entre 10 elevado al numero de decimales el resultado es el mismo que con float()
+    precios = entero / 10.0 ** numDecimales
+
+    precios[~valido | (numCifras == 0) | (numCifras > _MAX_CIFRAS)] = np.nan
+
+    return precios
+
+'''
+@param precio: precio por noche
+@param noches: numero minimo de noches
+@param limpieza: gastos de limpieza
+@return coste de la estancia minima: el precio de las noches minimas mas los gastos de limpieza
+'''
+def costeMinimo(precio, noches, limpieza):
+    return precio * noches + limpieza
+
+'''
+@param precio: precio por noche
+@param noches: numero minimo de noches
+@param limpieza: gastos de limpieza
+@param plazas: numero de plazas
+@return coste por persona y noche de la estancia minima (con los gastos de limpieza) redondeado a dos decimales, NaN si
+        las noches o las plazas son 0
+'''
+def costePersonaNoche(precio, noches, limpieza, plazas):
+    divisor = noches * plazas
+    return np.round(costeMinimo(precio, noches, limpieza) / np.where(divisor != 0, divisor, np.nan), 2)
+
+'''
+@param data frame bloque: bloque de alojamientos con las columnas de COLUMNAS_COSTES
+@return data frame con el id, los precios convertidos y los costes de cada alojamiento
+'''
+def _costesBloque(bloque):
+    import pandas as pd
+
+    precio = parsearPrecios(bloque.price)
+    limpieza = parsearPrecios(bloque.cleaning_fee)
+    noches = bloque.minimum_nights.to_numpy(dtype = 'float64')
+    plazas = bloque.accommodates.to_numpy(dtype = 'float64')
+
+    return pd.DataFrame({'id': bloque.id.to_numpy(), 'precio': precio, 'gastos_limpieza': limpieza,
+                         'coste_minimo': costeMinimo(precio, noches, limpieza),
+                         'precio_persona': costePersonaNoche(precio, noches, limpieza, plazas)})
+
+'''
+@param string ruta: ruta del fichero de alojamientos
+@param int tamBloque: numero de alojamientos de cada bloque
+@description Generador que calcula los costes del fichero por bloques, leyendo solo las columnas que hacen falta, de tal
+            manera que se pueden procesar ficheros que no caben en memoria
+@return Cada iteracion devuelve un data frame con los costes de como mucho tamBloque alojamientos
+'''
+def costesFichero(ruta, tamBloque = 1000000):
+    import pandas as pd
+
+    with pd.read_csv(ruta, sep = '\t', usecols = COLUMNAS_COSTES, dtype = {'price': 'str', 'cleaning_fee': 'str'},
+                     chunksize = tamBloque) as lector:
+        for bloque in lector:
+            yield _costesBloque(bloque)
+
+'''
+@param string ruta: ruta del fichero de alojamientos
+@param string salida: ruta del fichero donde se escriben los costes (separado por tabuladores)
+@param int tamBloque: numero de alojamientos de cada bloque
+@description Escribe los costes de todos los alojamientos del fichero bloque a bloque
+@return numero de alojamientos procesados
+'''
+def guardarCostes(ruta, salida, tamBloque = 1000000):
+    total = 0
+
+    for numero, bloque in enumerate(costesFichero(ruta, tamBloque)):
+        bloque.to_csv(salida, sep = '\t', index = False, mode = 'w' if numero == 0 else 'a', header = numero == 0)
+        total += len(bloque)
+
+    return total
+
+if __name__ == '__main__':
+    # python costes.py fichero.csv salida.csv
+    if len(sys.argv) != 3:
+        print('ERROR: uso python costes.py fichero.csv salida.csv')
+        sys.exit(1)
+
+    try:
+        total = guardarCostes(sys.argv[1], sys.argv[2])
+
+    except FileNotFoundError:
+        print('ERROR: File not found')
+        sys.exit(1)
+
+    print('SUCCESS: Costes de %d alojamientos guardados' % total)
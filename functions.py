@@ -7,6 +7,12 @@ en lugar de particulares, para alquiler turístico en el centro de Madrid.
 '''
 
 import csv
+from array import array
+
+import numpy as np
+
+from costes import parsearPrecio
+from instrumentacion import medir
 
 #Extraer del fichero de alojamientos una lista con todos los alojamientos, donde cada alojamiento sea un diccionario
 # que contenga el identificador del alojamiento, el identificador del anfitrión, el distrito, el precio y las plazas.
@@ -14,53 +20,316 @@ import csv
 # Definir el dialecto para el archivo csv
 dialect = csv.excel_tab
 
-try:
+# Columnas del fichero que nos interesan y la clave con la que las guardamos en cada alojamiento
+COLUMNAS = {'id': 'id', 'host_id': 'id_anfitrion', 'neighbourhood': 'distrito', 'price': 'precio', 'accommodates': 'plazas'}
+
+'''
+@param string texto: valor de la celda tal y como viene en el fichero
+@description Convierte una celda a entero, si la celda esta vacia devuelve None
+'''
+def _entero(texto):
+    return int(texto) if texto else None
+
+'''
+@param string ruta: ruta del fichero de alojamientos
+@param int tamBloque: numero de alojamientos de cada bloque
+@description Generador que lee el fichero de alojamientos por bloques. Las posiciones de las columnas se buscan una
+            sola vez en el encabezado y cada campo se convierte a su tipo (enteros para los identificadores y las plazas
+            y float para el precio), de tal manera que en memoria solo hay un bloque de alojamientos a la vez.
+@return Cada iteracion devuelve una lista de como mucho tamBloque alojamientos{diccionario}
+'''
+def leerAlojamientos(ruta, tamBloque = 10000):
+
     # Abrir el archivo y leer su contenido como un objeto CSV con el dialecto especificado
-    with open('madrid-airbnb-listings-small.csv') as lector_csv:
-        data = csv.reader(lector_csv, dialect=dialect)
-        # Salta la primera fila, de tal manera que desplaza el puntero alamcenando la primera fila en una instancia
-        encabezado = next(lector_csv)
+    with open(ruta, newline = '', encoding = 'utf-8') as lector_csv:
+        data = csv.reader(lector_csv, dialect = dialect)
 
-        # Almacenamos los valores del encabezado que guardamos en la variable encabezado
-        listaEncabezado = encabezado.split('\t')
+        # La primera fila es el encabezado, buscamos en el la posicion de cada columna que nos interesa
+        listaEncabezado = next(data)
+        posiciones = [listaEncabezado.index(columna) for columna in COLUMNAS]
+        posId, posAnfitrion, posDistrito, posPrecio, posPlazas = posiciones
+        ultimaPosicion = max(posiciones)
 
-        # Crear una lista vacía para almacenar los alojamientos
-        alojamientos = []
+        bloque = []
 
         # Recorrer las filas del archivo y extraer los campos que nos interesan para cada alojamiento
         for row in data:
+            # Las filas incompletas no tienen todos los campos, asi que las saltamos
+            if len(row) <= ultimaPosicion:
+                continue
+
             #Hacemos un diccionario con los datos de tal manera que podremos acceder a ellos a traves del nombre de la columna
-            aloj = {
-                'id': row[listaEncabezado.index('id')],
-                'id_anfitrion': row[listaEncabezado.index('host_id')],
-                'distrito': row[listaEncabezado.index('neighbourhood')],
-                'precio': row[listaEncabezado.index('price')],
-                'plazas': row[listaEncabezado.index('accommodates')]
-            }
-            alojamientos.append(aloj)
-
-#Si el archivo no se encuentra salta la excepcion FileNotFoundError que imprime por pontalla eso mismo
-except FileNotFoundError:
-    print('ERROR: File not found')
+            bloque.append({
+                'id': _entero(row[posId]),
+                'id_anfitrion': _entero(row[posAnfitrion]),
+                'distrito': row[posDistrito],
+                'precio': parsearPrecio(row[posPrecio]),
+                'plazas': _entero(row[posPlazas])
+            })
+
+            # Cuando el bloque esta lleno lo devolvemos y empezamos uno nuevo
+            if len(bloque) == tamBloque:
+                yield bloque
+                bloque = []
+
+        # Devolvemos el ultimo bloque, que puede estar incompleto
+        if bloque:
+            yield bloque
+
+'''
+@param alojamientos: lista de alojamientos{diccionario} o generador de bloques de alojamientos (leerAlojamientos)
+@description Recorre los alojamientos uno a uno, tanto si se pasa la lista completa como si se pasan por bloques
+'''
+def _recorrerAlojamientos(alojamientos):
+    for elemento in alojamientos:
+        # Si es un alojamiento lo devolvemos directamente, si es un bloque devolvemos sus alojamientos
+        if isinstance(elemento, dict):
+            yield elemento
+        else:
+            yield from elemento
+
+# Valor que guardamos en las columnas enteras cuando la celda esta vacia (en el precio se usa NaN)
+SIN_VALOR = -1
+
+'''
+@description Almacen columnar de alojamientos. En lugar de un diccionario por alojamiento se guarda un array de numpy
+            por cada campo, ya convertido a su tipo: enteros para los identificadores y las plazas, float para el precio
+            y el distrito codificado como un entero que indexa la lista nombresDistritos. Las funciones del modulo
+            reconocen la tabla y la recorren con operaciones vectorizadas en lugar de fila a fila.
+'''
+class TablaAlojamientos:
+
+    def __init__(self, ids, anfitriones, distritos, nombresDistritos, precios, plazas):
+        self.ids = ids
+        self.anfitriones = anfitriones
+        self.distritos = distritos
+        self.nombresDistritos = nombresDistritos
+        self.precios = precios
+        self.plazas = plazas
+
+        # Guardamos los conteos ya calculados para que repetir una consulta no vuelva a recorrer los arrays
+        self._conteos = {}
+        self._indice = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Recorrer la tabla devuelve los alojamientos como diccionarios, igual que la lista del fichero
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.alojamiento(i)
+
+    '''
+    @param int i: posicion del alojamiento en la tabla
+    @return el alojamiento{diccionario} de la posicion i
+    '''
+    def alojamiento(self, i):
+        anfitrion, plazas, precio = int(self.anfitriones[i]), int(self.plazas[i]), float(self.precios[i])
+
+        return {
+            'id': int(self.ids[i]),
+            'id_anfitrion': None if anfitrion == SIN_VALOR else anfitrion,
+            'distrito': self.nombresDistritos[self.distritos[i]],
+            'precio': None if np.isnan(precio) else precio,
+            'plazas': None if plazas == SIN_VALOR else plazas
+        }
+
+    '''
+    @param string distrito: nombre del distrito
+    @return el codigo del distrito en la tabla, o SIN_VALOR si no hay alojamientos en ese distrito
+    '''
+    def codigoDistrito(self, distrito):
+        try:
+            return self.nombresDistritos.index(distrito)
+        except ValueError:
+            return SIN_VALOR
+
+    '''
+    @param seleccion: mascara booleana o array de posiciones de los alojamientos que queremos
+    @return una nueva tabla solo con los alojamientos seleccionados, en el orden de la seleccion
+    '''
+    def filtrar(self, seleccion):
+        return TablaAlojamientos(self.ids[seleccion], self.anfitriones[seleccion], self.distritos[seleccion],
+                                 self.nombresDistritos, self.precios[seleccion], self.plazas[seleccion])
+
+    '''
+    @param string columna: 'distritos' o 'anfitriones'
+    @return los valores distintos de la columna y cuantas veces aparece cada uno
+    '''
+    def contar(self, columna):
+        if columna not in self._conteos:
+            if columna == 'distritos':
+                # Los distritos ya son enteros de 0 a len(nombresDistritos), asi que basta con bincount
+                cuentas = np.bincount(self.distritos, minlength = len(self.nombresDistritos))
+                self._conteos[columna] = (np.arange(len(cuentas)), cuentas)
+            else:
+                self._conteos[columna] = np.unique(getattr(self, columna), return_counts = True)
+
+        return self._conteos[columna]
+
+    '''
+    @description El indice se construye la primera vez que se pide y se reutiliza en el resto de consultas
+    @return el IndiceTabla de la tabla
+    '''
+    def indice(self):
+        if self._indice is None:
+            self._indice = IndiceTabla(self)
+
+        return self._indice
+
+'''
+@param array ordenados: array ordenado de codigos
+@param int total: numero de codigos distintos posibles (los codigos van de 0 a total - 1)
+@return array con la posicion de inicio de cada codigo en ordenados, con un elemento mas al final para el fin del ultimo
+'''
+def _inicios(ordenados, total):
+    return np.searchsorted(ordenados, np.arange(total + 1))
+
+'''
+@param TablaAlojamientos tabla: tabla sobre la que se construye el indice
+@description Indice de una TablaAlojamientos para responder consultas repetidas sin recorrer la tabla entera. Guarda las
+            posiciones de los alojamientos ordenadas por distrito y dentro de cada distrito por precio (los que no tienen
+            precio al final), ordenadas por anfitrion y ordenadas por plazas, junto con el inicio de cada distrito,
+            anfitrion y numero de plazas en esas ordenaciones. Asi cada consulta es una busqueda binaria y un corte.
+'''
+class IndiceTabla:
+
+    def __init__(self, tabla):
+        self.tabla = tabla
+
+        # lexsort ordena por la ultima clave y desempata con las anteriores, y es estable igual que sorted
+        self.porDistrito = np.lexsort((tabla.precios, tabla.distritos))
+        self.iniciosDistrito = _inicios(tabla.distritos[self.porDistrito], len(tabla.nombresDistritos))
+
+        # Numero de alojamientos con precio en cada distrito, que estan al principio de su tramo
+        conPrecio = np.bincount(tabla.distritos[~np.isnan(tabla.precios)], minlength = len(tabla.nombresDistritos))
+        self.finesPrecio = self.iniciosDistrito[:-1] + conPrecio
+
+        self.porAnfitrion = np.argsort(tabla.anfitriones, kind = 'stable')
+        self.anfitriones, self.iniciosAnfitrion = np.unique(tabla.anfitriones[self.porAnfitrion], return_index = True)
+        self.iniciosAnfitrion = np.append(self.iniciosAnfitrion, len(tabla))
+
+        self.porPlazas = np.argsort(tabla.plazas, kind = 'stable')
+        self.plazasOrdenadas = tabla.plazas[self.porPlazas]
+
+    '''
+    @param string distrito: nombre del distrito
+    @return las posiciones de los alojamientos del distrito, de menor a mayor precio
+    '''
+    def posicionesDistrito(self, distrito):
+        codigo = self.tabla.codigoDistrito(distrito)
+        if codigo == SIN_VALOR:
+            return self.porDistrito[:0]
+
+        return self.porDistrito[self.iniciosDistrito[codigo]:self.iniciosDistrito[codigo + 1]]
+
+    '''
+    @param string distrito: nombre del distrito
+    @param int cant: cantidad a devolver
+    @return las posiciones de los cant alojamientos con precio mas baratos del distrito, de menor a mayor precio
+    '''
+    def baratos(self, distrito, cant):
+        codigo = self.tabla.codigoDistrito(distrito)
+        if codigo == SIN_VALOR:
+            return self.porDistrito[:0]
+
+        return self.porDistrito[self.iniciosDistrito[codigo]:self.finesPrecio[codigo]][:cant]
+
+    '''
+    @param int anfitrion: identificador del anfitrion
+    @return las posiciones de los alojamientos del anfitrion, en el orden de la tabla
+    '''
+    def posicionesAnfitrion(self, anfitrion):
+        i = np.searchsorted(self.anfitriones, anfitrion)
+        if i == len(self.anfitriones) or self.anfitriones[i] != anfitrion:
+            return self.porAnfitrion[:0]
+
+        return self.porAnfitrion[self.iniciosAnfitrion[i]:self.iniciosAnfitrion[i + 1]]
+
+    '''
+    @param int ocupantes: numero de ocupantes
+    @return las posiciones de los alojamientos con plazas para los ocupantes, en el orden de la tabla
+    '''
+    def disponibles(self, ocupantes):
+        # Las plazas vacias son SIN_VALOR, asi que nunca quedan dentro aunque se pidan 0 ocupantes
+        inicio = np.searchsorted(self.plazasOrdenadas, max(ocupantes, 0))
+        return np.sort(self.porPlazas[inicio:])
+
+'''
+@param alojamientos: lista de alojamientos{diccionario} o generador de bloques de alojamientos (leerAlojamientos)
+@description Construye una TablaAlojamientos. Los campos se van acumulando en arrays compactos de la libreria estandar
+            bloque a bloque y al final se pasan a numpy sin copiar, de tal manera que nunca se guardan todos los
+            diccionarios a la vez.
+@return TablaAlojamientos con todos los alojamientos
+'''
+@medir
+def tablaAlojamientos(alojamientos):
+
+    ids, anfitriones, distritos, precios, plazas = array('q'), array('q'), array('i'), array('d'), array('i')
+
+    # Diccionario para codificar cada distrito con un entero, en orden de aparicion
+    codigos = {}
+
+    for alojamiento in _recorrerAlojamientos(alojamientos):
+        distrito = alojamiento['distrito']
+        if distrito not in codigos:
+            codigos[distrito] = len(codigos)
+
+        ids.append(alojamiento['id'])
+        anfitriones.append(SIN_VALOR if alojamiento['id_anfitrion'] is None else alojamiento['id_anfitrion'])
+        distritos.append(codigos[distrito])
+        precios.append(float('nan') if alojamiento['precio'] is None else alojamiento['precio'])
+        plazas.append(SIN_VALOR if alojamiento['plazas'] is None else alojamiento['plazas'])
+
+    return TablaAlojamientos(np.frombuffer(ids, dtype = np.int64), np.frombuffer(anfitriones, dtype = np.int64),
+                             np.frombuffer(distritos, dtype = np.int32), list(codigos),
+                             np.frombuffer(precios, dtype = np.float64), np.frombuffer(plazas, dtype = np.int32))
+
+'''
+@param string ruta: ruta del fichero de alojamientos
+@param int tamBloque: numero de alojamientos que se leen a la vez
+@return TablaAlojamientos con todos los alojamientos del fichero
+'''
+@medir
+def leerTabla(ruta, tamBloque = 10000):
+    return tablaAlojamientos(leerAlojamientos(ruta, tamBloque))
+
+# Fichero de alojamientos que se analiza
+FICHERO = 'madrid-airbnb-listings-small.csv'
+
+'''
+@param string nombre: nombre del atributo del modulo
+@description La lista con todos los alojamientos del FICHERO (alojamientos) se lee la primera vez que se usa y no al
+            importar el modulo
+'''
+def __getattr__(nombre):
+    if nombre == 'alojamientos':
+        # Crear la lista con todos los alojamientos juntando los bloques que devuelve el generador
+        globals()['alojamientos'] = [alojamiento for bloque in leerAlojamientos(FICHERO) for alojamiento in bloque]
+        return globals()['alojamientos']
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, nombre))
 
 ####################################### - FUNCIONES - ##################################################################
 '''
-@param array[alojamiento{diccionario}] alojamientos
+@param array[alojamiento{diccionario}] alojamientos: lista de alojamientos, generador de bloques (leerAlojamientos) o TablaAlojamientos
 @description Crear una función que reciba la lista de alojamientos y devuelva el número de alojamientos en cada distrito.
 '''
+@medir
 def alojamientosDistritos (alojamientos):
-    #creamos el array que contendra los distritos
-    distritos = []
 
-    #Metemos los distritos dentro del array para despues contarlos
-    for alojamiento in alojamientos:
-        distritos.append(alojamiento['distrito'])
+    # Con la tabla columnar los distritos ya estan contados con bincount, solo hay que ponerles el nombre
+    if isinstance(alojamientos, TablaAlojamientos):
+        codigos, cuentas = alojamientos.contar('distritos')
+        return {alojamientos.nombresDistritos[codigo]: int(cuenta) for codigo, cuenta in zip(codigos, cuentas) if cuenta}
 
     # Creamos el diccionario para almacenar los resultados
     conteoDistritos = {}
 
-    # Recorremos los elementos del array de distritos
-    for distrito in distritos:
+    # Recorremos los alojamientos una sola vez contando cada distrito, sin guardar una lista intermedia
+    for alojamiento in _recorrerAlojamientos(alojamientos):
+        distrito = alojamiento['distrito']
+
         # Si el distrito aún no está en el diccionario, lo agregamos y lo inicializamos a 1
         if distrito not in conteoDistritos:
             conteoDistritos[distrito] = 1
@@ -71,69 +340,98 @@ def alojamientosDistritos (alojamientos):
     return conteoDistritos
 
 '''
-@param array[alojamiento{diccionario}] alojamientos
+@param array[alojamiento{diccionario}] alojamientos: lista de alojamientos, generador de bloques (leerAlojamientos) o TablaAlojamientos
 @param int numOcupantes
-@description Crear una función que reciba la lista de alojamientos y un número de ocupantes y devuelva la lista de 
-            alojamientos con un número de plazas mayor o igual que el número de ocupantes.
+@description Crear una función que reciba la lista de alojamientos y un número de ocupantes y devuelva la lista de
+            alojamientos con un número de plazas mayor o igual que el número de ocupantes. Si se pasa una
+            TablaAlojamientos se devuelve otra TablaAlojamientos.
 '''
+@medir
 def disponibilidadAlojamiento(alojamientos, ocupantes):
 
+    # Con la tabla columnar buscamos en el indice el primer alojamiento con suficientes plazas y devolvemos otra tabla
+    if isinstance(alojamientos, TablaAlojamientos):
+        return alojamientos.filtrar(alojamientos.indice().disponibles(ocupantes))
+
     #hago un arraya auxiliar para copiar los alojamientos con plazas disponibles
     alojamientosDisponibles = []
 
-    for alojamiento in alojamientos:
-        #casteo el dato a int y compruebo
-        if(int(alojamiento['plazas']) >= ocupantes):
+    for alojamiento in _recorrerAlojamientos(alojamientos):
+        plazas = alojamiento['plazas']
+
+        #casteo el dato a int y compruebo, los alojamientos sin plazas no se tienen en cuenta
+        if plazas is not None and int(plazas) >= ocupantes:
             alojamientosDisponibles.append(alojamiento)
 
     return alojamientosDisponibles
 
 '''
-@param array[alojamiento{diccionario}] alojamientos: lista de alojamientos 
+@param array[alojamiento{diccionario}] alojamientos: lista de alojamientos o TablaAlojamientos
 @param string distrito: distrito a estudiar
 @param int cant: cantidad a devolver
 @description Crear una función que reciba la lista de alojamientos un distrito, y devuelva los Cant alojamientos más baratos del distrito.
+            Si se pasa una TablaAlojamientos se devuelve otra TablaAlojamientos.
 '''
+@medir
 def alojamientosBaratos(alojamientos, distrito, cant):
 
-    # Filtramos los alojamientos del distrito
-    alojamientosDistrito = [alojamiento for alojamiento in alojamientos if alojamiento['distrito'] == distrito]
+    # Con la tabla columnar el indice ya tiene cada distrito ordenado por precio (con un orden estable, igual que sorted,
+    # que respeta el orden del fichero en los empates), asi que basta con coger los cant primeros
+    if isinstance(alojamientos, TablaAlojamientos):
+        return alojamientos.filtrar(alojamientos.indice().baratos(distrito, cant))
+
+    # Filtramos los alojamientos del distrito, los que no tienen precio no se pueden ordenar asi que los quitamos
+    alojamientosDistrito = [alojamiento for alojamiento in alojamientos
+                            if alojamiento['distrito'] == distrito and alojamiento['precio'] is not None]
 
     # Ordeno los alojamientos por precio de menor a mayor
     # Gracias a la funcion sorted que ordena listas, y su funcion para recorrer en funcion de claves se puede realizar de manera muy sencilla
     # lambda x es una forma de crear una función anónima (es decir, sin nombre) en Python. En este caso, se utiliza para definir una función
-    # que toma un argumento x y devuelve un valor. En la función sorted(), se utiliza key=lambda x: int(x['precio']) para indicar que se debe
-    # ordenar la lista de alojamientos por el precio de cada alojamiento. poniendo [1:] obvio el simbolo del dolar y cojo solo el precio
-    alojamientosOrdenados = sorted(alojamientosDistrito, key = lambda x : float(x['precio'][1:]))
+    # que toma un argumento x y devuelve un valor. En la función sorted(), se utiliza key=lambda x: x['precio'] para indicar que se debe
+    # ordenar la lista de alojamientos por el precio de cada alojamiento, que ya viene convertido a float desde la lectura
+    alojamientosOrdenados = sorted(alojamientosDistrito, key = lambda x : x['precio'])
 
     # Devuelvo los cant primeros alojamientos (los más baratos)
     return alojamientosOrdenados[:cant]
 
 '''
-@param array[alojamiento{diccionario}] alojamientos: lista de alojamientos 
+@param array[alojamiento{diccionario}] alojamientos: lista de alojamientos, generador de bloques (leerAlojamientos) o TablaAlojamientos
 @description Crear una función que reciba la lista de alojamientos y devuelva un diccionario con los anfitriones y el
             número de alojamientos que posee cada uno.
 '''
+@medir
 def landlords (alojamientos):
 
+    # Con la tabla columnar los anfitriones se cuentan con np.unique
+    if isinstance(alojamientos, TablaAlojamientos):
+        anfitriones, cuentas = alojamientos.contar('anfitriones')
+        return {(None if anfitrion == SIN_VALOR else int(anfitrion)): int(cuenta) for anfitrion, cuenta in zip(anfitriones, cuentas)}
+
     #Hago un diccionario de datos para meter a los landlords con sus respectivas casas (recordemos que los diccionarios de datos
     #se hacen con los corchetes
-    propietarios = []
-
-    # Metemos los anfitriones dentro del array para despues contarlos
-    for alojamiento in alojamientos:
-        propietarios.append(alojamiento['id_anfitrion'])
-
     conteoPropietarios = {}
 
-    # Recorremos los elementos del array de distritos
-    for propietario in propietarios:
-        # Si el distrito aún no está en el diccionario, lo agregamos y lo inicializamos a 1
+    # Recorremos los alojamientos una sola vez contando los alojamientos de cada anfitrion
+    for alojamiento in _recorrerAlojamientos(alojamientos):
+        propietario = alojamiento['id_anfitrion']
+
+        # Si el anfitrion aún no está en el diccionario, lo agregamos y lo inicializamos a 1
         if propietario not in conteoPropietarios:
             conteoPropietarios[propietario] = 1
 
-        # Si el distrito ya está en el diccionario, aumentamos su contador en 1
+        # Si el anfitrion ya está en el diccionario, aumentamos su contador en 1
         else:
             conteoPropietarios[propietario] += 1
 
-    return conteoPropietarios
\ No newline at end of file
+    return conteoPropietarios
+
+if __name__ == '__main__':
+    try:
+        tabla = leerTabla(FICHERO)
+
+    #Si el archivo no se encuentra salta la excepcion FileNotFoundError que imprime por pontalla eso mismo
+    except FileNotFoundError:
+        print('ERROR: File not found')
+
+    else:
+        print(alojamientosDistritos(tabla))
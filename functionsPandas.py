@@ -4,59 +4,353 @@
 @company USC ETSE
 '''
 
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+
+import numpy as np
 import pandas as pd
-from langdetect import detect
-import matplotlib.pyplot as plt
+
+from costes import costeMinimo, costePersonaNoche, parsearPrecios
+from instrumentacion import anotar, etapa, medir, memoriaResidente, picoMemoria
+
+# Fichero de alojamientos que se analiza
+FICHERO = 'madrid-airbnb-listings-small.csv'
+
+# Version del preprocesado. Si se cambia la funcion preprocesar hay que subirla para que la cache se vuelva a generar
+VERSION_PREPROCESADO = 5
+
+# Columnas del fichero que usamos y el nombre con el que las guardamos en el data frame
+COLUMNAS = {'id': 'id', 'host_id': 'propietario', 'listing_url': 'url', 'room_type': 'tipo_alojamiento',
+            'neighbourhood_group_cleansed': 'distrito', 'price': 'precio', 'cleaning_fee': 'gastos_limpieza',
+            'accommodates': 'plazas', 'minimum_nights': 'noches_minimas', 'review_scores_rating': 'puntuacion', 'name': 'nombre',
+            'latitude': 'latitud', 'longitude': 'longitud'}
+
+# Tipos con los que se leen las columnas. Los enteros se leen como enteros con nulos (Int) porque el fichero tiene celdas
+# vacias, y despues de eliminar las filas incompletas se pasan a enteros normales. Los precios se leen como texto ($1,234.00)
+TIPOS = {'id': 'Int64', 'host_id': 'Int64', 'listing_url': 'str', 'room_type': 'category',
+         'neighbourhood_group_cleansed': 'category', 'price': 'str', 'cleaning_fee': 'str', 'accommodates': 'Int32',
+         'minimum_nights': 'Int32', 'review_scores_rating': 'float32', 'name': 'str',
+         'latitude': 'float64', 'longitude': 'float64'}
 
 '''
+@param string ruta: ruta del fichero de alojamientos
+@param bool informe: si es True se imprime el tiempo de lectura y cuanto crece la memoria residente del proceso hasta su
+            pico (incluye la memoria de pandas y pyarrow que no pasa por Python)
 @description Preprocesar el fichero de alojamientos para crear un data frame con las variables id, host_id, listing_url, 
             room_type, neighbourhood_group_cleansed, price, cleaning_fee, accommodates, minimum_nights, minimum_cost, review_scores_rating, 
             latitude, longitude, is_location_exact. Eliminar del data frame cualquier fila incompleta. Añadir al data frame nuevas variables 
-            con el coste mínimo por noche y por persona (que incluya los gastos de limpieza).
+            con el coste mínimo por noche y por persona (que incluya los gastos de limpieza). Del fichero solo se leen las
+            columnas de COLUMNAS y cada una con su tipo de TIPOS, asi que las columnas de texto largo (descripciones,
+            servicios...) ni se llegan a leer.
+@return data frame con los alojamientos preprocesados
 '''
-#Basicamente un data frame se trata de una tabla con las filas y las columnas del .csv
-try:
-    data = pd.read_csv('madrid-airbnb-listings-small.csv', sep = '\t')
+@medir
+def preprocesar(ruta, informe = False):
+
+    if informe:
+        memoria, inicio = memoriaResidente(), time.perf_counter()
 
-except FileNotFoundError:
-    print('ERROR: File not found')
+    #Basicamente un data frame se trata de una tabla con las filas y las columnas del .csv
+    # con usecols solo se leen las columnas que nos interesan y con dtype se indica el tipo de cada una en lugar de adivinarlo
+    with etapa('functionsPandas.preprocesar.lectura'):
+        data = pd.read_csv(ruta, sep = '\t', usecols = list(COLUMNAS), dtype = TIPOS)
 
-else:
     # Renombramos los nombres de las columnas que queremos
     # #inplace = True es un parámetro que se puede utilizar en varias funciones de Pandas, como dropna(), drop(), fillna(),
     #entre otras. Cuando se establece a True, se modifica el objeto DataFrame original en lugar de devolver una copia del objeto modificado.
-    data.rename(columns={'host_id': 'propietario', 'listing_url': 'url', 'room_type': 'tipo_alojamiento',
-                                     'neighbourhood_group_cleansed': 'distrito', 'price': 'precio',
-                                     'cleaning_fee': 'gastos_limpieza', 'accommodates': 'plazas',
-                                     'minimum_nights': 'noches_minimas', 'review_scores_rating': 'puntuacion', 'name': 'nombre'}, inplace = True)
+    data.rename(columns = COLUMNAS, inplace = True)
+
+    # Ordenamos las columnas como en COLUMNAS (usecols las deja en el orden del fichero)
+    data = data[list(COLUMNAS.values())]
 
-    # Filtramos las columnas que queremos
-    data = data[ ['id', 'propietario', 'url', 'tipo_alojamiento', 'distrito', 'precio', 'gastos_limpieza', 'plazas',
-             'noches_minimas', 'puntuacion', 'nombre']]
+    # Eliminamos el carácter $ y las comas de las columnas del precio y gastos_limpieza y las convertimos a float
+    # antes de quitar las filas incompletas, asi un precio que no se pueda leer tambien cuenta como incompleto
+    with etapa('functionsPandas.preprocesar.precios', data):
+        data['precio'] = parsearPrecios(data.precio)
+        data['gastos_limpieza'] = parsearPrecios(data.gastos_limpieza)
 
     # Eliminamos las filas con valores NaN
-    data = data.dropna()
+    with etapa('functionsPandas.preprocesar.dropna', data):
+        filasLeidas = len(data)
+        data = data.dropna()
+        anotar(filasSalida = len(data), filasEliminadas = filasLeidas - len(data))
 
-    # Eliminamos el carácter $ de las columnas del precio y gastos_limpieza y las convertimos a float
-    # con str[1:] obviamos el primer caracter del string ($) y cogemos solo el numero para despues convertirlo a float con astype
-    # qeu convierte la/s variables que ke indiquemos al tipo de dato que le indiquemos
-    data['precio'] = data.precio.str.replace(',', '').str[1:].astype('float')
-    data['gastos_limpieza'] = data.gastos_limpieza.str[1:].astype('float')
+    # Ya sin nulos pasamos los enteros a su tipo compacto y quitamos de las categorias los valores que solo estaban en filas eliminadas
+    data = data.astype({'id': 'int64', 'propietario': 'int64', 'plazas': 'int32', 'noches_minimas': 'int32'})
+    data['distrito'] = data.distrito.cat.remove_unused_categories()
+    data['tipo_alojamiento'] = data.tipo_alojamiento.cat.remove_unused_categories()
 
-    # Creamos una nueva columna con el precio por persona multiplicando el precio diario por el número mínimo de noches, sumando los gastos de limpieza y finalmente dividiendo por el número mínimo de noches y el número de plazas.
-    # Con round redondeamos a dos decimales para que quede un precio mas exacto
-    data['precio_persona'] = round( (data.precio * data.noches_minimas + data.gastos_limpieza) / (data.noches_minimas + data.plazas), 2)
+    # Creamos una columna con el coste de la estancia minima multiplicando el precio diario por el número mínimo de noches y sumando los gastos de limpieza,
+    # y otra con el precio por persona y noche dividiendo ese coste por el número mínimo de noches y el número de plazas (redondeado a dos decimales)
+    data['coste_minimo'] = costeMinimo(data.precio, data.noches_minimas, data.gastos_limpieza)
+    data['precio_persona'] = costePersonaNoche(data.precio, data.noches_minimas, data.gastos_limpieza, data.plazas)
+
+    if informe:
+        tiempo, pico = time.perf_counter() - inicio, picoMemoria()
+
+        # El pico es el de todo el proceso, asi que si ya era mayor antes de leer el fichero el crecimiento sale 0
+        if memoria is None or pico is None:
+            print('INFO: %d alojamientos leidos en %.2f s' % (len(data), tiempo))
+        else:
+            print('INFO: %d alojamientos leidos en %.2f s, pico de memoria +%.1f MB' % (len(data), tiempo, max(pico - memoria, 0)))
+
+    return data
+
+'''
+@param string ruta: ruta del fichero
+@description Calcula el hash sha1 del contenido del fichero leyendolo por bloques de 1MB
+'''
+def _hashFichero(ruta):
+    resumen = hashlib.sha1()
+
+    with open(ruta, 'rb') as fichero:
+        for bloque in iter(lambda: fichero.read(1 << 20), b''):
+            resumen.update(bloque)
+
+    return resumen.hexdigest()
+
+'''
+@param string ruta: ruta del fichero que se va a escribir
+@description Crea un fichero temporal con un nombre unico en la misma carpeta, asi dos procesos que escriben la misma
+            cache a la vez no se pisan el fichero temporal
+@return descriptor y ruta del fichero temporal
+'''
+def _temporal(ruta):
+    return tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(ruta)), prefix = os.path.basename(ruta) + '.', suffix = '.tmp')
+
+'''
+@param string ruta: ruta del fichero json
+@param dict datos: diccionario a guardar
+@description Guarda un diccionario en un fichero json reemplazando el anterior de una sola vez
+'''
+def _guardarJson(ruta, datos):
+    descriptor, temporal = _temporal(ruta)
+
+    try:
+        with os.fdopen(descriptor, 'w') as fichero:
+            json.dump(datos, fichero)
+
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+'''
+@param string ruta: ruta del fichero de alojamientos
+@param bool cache: si es False se preprocesa siempre el fichero sin leer ni escribir la cache
+@param bool informe: si es True y hay que leer el fichero se imprime el tiempo de lectura y el crecimiento de la memoria
+@description Devuelve el data frame preprocesado del fichero usando una cache en formato Feather (columnar y binario) que
+            se guarda al lado del fichero (ruta.cache.feather). La clave de la cache es el tamaño, la fecha de modificacion
+            y el hash del fichero junto con VERSION_PREPROCESADO, y se guarda en ruta.cache.json. Si el tamaño y la fecha
+            coinciden la cache se usa directamente; si solo cambia la fecha se calcula el hash para saber si el contenido
+            es el mismo. La cache se lee con memory map y las columnas numericas se usan directamente sin copiarlas
+            (las de texto y las categorias si se convierten). Si pyarrow no esta instalado o la cache no se puede escribir
+            (carpeta de solo lectura, disco lleno...) simplemente se preprocesa el fichero.
+@return data frame con los alojamientos preprocesados
+'''
+@medir
+def cargarAlojamientos(ruta = FICHERO, cache = True, informe = False):
+
+    # Si no existe el fichero salta FileNotFoundError igual que al leerlo
+    estado = os.stat(ruta)
+
+    try:
+        from pyarrow import feather
+    except ImportError:
+        cache = False
+
+    if not cache:
+        return preprocesar(ruta, informe)
+
+    rutaCache, rutaClave = ruta + '.cache.feather', ruta + '.cache.json'
+    clave = {'version': VERSION_PREPROCESADO, 'tamano': estado.st_size, 'modificacion': estado.st_mtime_ns}
+
+    # Leemos la clave de la cache anterior, si no hay o esta corrupta la ignoramos
+    try:
+        with open(rutaClave) as fichero:
+            claveGuardada = json.load(fichero)
+    except (OSError, ValueError):
+        claveGuardada = {}
+
+    valida = os.path.exists(rutaCache) and claveGuardada.get('version') == clave['version'] and claveGuardada.get('tamano') == clave['tamano']
+
+    # Con el mismo tamaño pero distinta fecha (por ejemplo al copiar el fichero) comprobamos el contenido con el hash
+    if valida and claveGuardada.get('modificacion') != clave['modificacion']:
+        clave['hash'] = _hashFichero(ruta)
+        valida = claveGuardada.get('hash') == clave['hash']
+
+        # Si el contenido es el mismo actualizamos la fecha para no volver a calcular el hash la proxima vez
+        if valida:
+            try:
+                _guardarJson(rutaClave, clave)
+            except OSError:
+                pass
+
+    if valida:
+        # El indice se guarda como una columna porque Feather solo admite el indice por defecto. Con split_blocks cada
+        # columna queda en su propio bloque y las numericas sin nulos apuntan al memory map en lugar de copiarse
+        data = feather.read_table(rutaCache, memory_map = True).to_pandas(split_blocks = True).set_index('index')
+        data.index.name = None
+        return data
+
+    data = preprocesar(ruta, informe)
+
+    # Escribimos primero en un fichero temporal y luego lo renombramos, para que nunca quede una cache a medias. Si no se
+    # puede escribir devolvemos igualmente el data frame, que ya esta preprocesado
+    try:
+        clave['hash'] = clave.get('hash') or _hashFichero(ruta)
+        descriptor, temporal = _temporal(rutaCache)
+        os.close(descriptor)
+
+        try:
+            feather.write_feather(data.reset_index(), temporal, compression = 'uncompressed')
+            os.replace(temporal, rutaCache)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+        _guardarJson(rutaClave, clave)
+
+    except OSError as error:
+        print('WARNING: No se pudo guardar la cache de %s: %s' % (ruta, error))
+
+    return data
+
+'''
+@param data frame data: data frame de alojamientos preprocesado
+@description Indice de un data frame de alojamientos para responder consultas repetidas sin recorrer el data frame
+            entero. Se construye una sola vez y guarda las filas de cada distrito (ordenadas por precio), las filas de
+            cada anfitrion, las filas ordenadas por plazas, el numero de alojamientos de cada tipo en cada distrito y el
+            numero de alojamientos de cada anfitrion en cada distrito. Las funciones que filtran por distritos aceptan
+            tanto el data frame como el indice.
+'''
+class IndiceAlojamientos:
+
+    def __init__(self, data):
+        self.data = data
+
+        # Posiciones de las filas de cada distrito ordenadas por precio (mergesort es estable y respeta el orden del fichero)
+        porPrecio = np.argsort(data.precio.to_numpy(), kind = 'mergesort')
+        distritos = data.distrito.to_numpy()[porPrecio]
+        self.filasDistrito = {distrito: porPrecio[distritos == distrito] for distrito in data.distrito.unique()}
+
+        self.filasPropietario = data.groupby('propietario').indices
+
+        self.porPlazas = np.argsort(data.plazas.to_numpy(), kind = 'mergesort')
+        self.plazasOrdenadas = data.plazas.to_numpy()[self.porPlazas]
+
+        self.tipos = pd.crosstab(data.distrito, data.tipo_alojamiento)
+        self.propietarios = data.groupby('distrito', observed = True).propietario.value_counts()
+
+    '''
+    @param distritos: lista con los nombres de los distritos
+    @return lista con los distritos que tienen alojamientos, sin repetidos y en el orden en que se pasan
+    '''
+    def _presentes(self, distritos):
+        return [distrito for distrito in dict.fromkeys(distritos) if distrito in self.filasDistrito]
+
+    '''
+    @param distritos: lista con los nombres de los distritos
+    @return data frame con los alojamientos de esos distritos, en el orden del data frame
+    '''
+    def filas(self, distritos):
+        posiciones = [self.filasDistrito[distrito] for distrito in self._presentes(distritos)]
+        return self.data.iloc[np.sort(np.concatenate(posiciones)) if posiciones else []]
+
+    '''
+    @param string distrito: nombre del distrito
+    @param int cant: cantidad a devolver
+    @return data frame con los cant alojamientos mas baratos del distrito, de menor a mayor precio
+    '''
+    def baratos(self, distrito, cant):
+        return self.data.iloc[self.filasDistrito.get(distrito, [])[:cant]]
+
+    '''
+    @param int propietario: identificador del anfitrion
+    @return data frame con los alojamientos del anfitrion
+    '''
+    def alojamientosPropietario(self, propietario):
+        return self.data.iloc[self.filasPropietario.get(propietario, [])]
+
+    '''
+    @param int ocupantes: numero de ocupantes
+    @return data frame con los alojamientos con plazas para los ocupantes, en el orden del data frame
+    '''
+    def disponibles(self, ocupantes):
+        return self.data.iloc[np.sort(self.porPlazas[np.searchsorted(self.plazasOrdenadas, ocupantes):])]
+
+    '''
+    @param distritos: lista con los nombres de los distritos
+    @return serie con el numero de alojamientos de cada tipo en esos distritos, de mas a menos alojamientos
+    '''
+    def conteoTipos(self, distritos):
+        conteo = self.tipos.loc[self._presentes(distritos)].sum()
+        return conteo[conteo > 0].sort_values(ascending = False)
+
+    '''
+    @param distritos: lista con los nombres de los distritos
+    @return serie con el numero de alojamientos de cada anfitrion en esos distritos
+    '''
+    def conteoPropietarios(self, distritos):
+        conteo = self.propietarios.loc[self._presentes(distritos)]
+        return conteo.groupby(level = 'propietario').sum()
+
+'''
+@param data frame data: data frame de alojamientos preprocesado
+@description Estadisticas de cada distrito calculadas de una sola vez agrupando el data frame por distrito una unica vez.
+            En resumen se guarda por distrito el numero de alojamientos, el numero de anfitriones, el precio medio por
+            persona y el numero medio de alojamientos por anfitrion, y en tipos el porcentaje de cada tipo de alojamiento.
+            Las funciones de estadisticas y graficas por distrito aceptan estas estadisticas en lugar del data frame, de
+            tal manera que si se llaman todas se agrupa una sola vez.
+'''
+class EstadisticasDistritos:
+
+    def __init__(self, data):
+
+        # Todas las estadisticas salen del mismo groupby, asi que los distritos se agrupan una sola vez
+        grupos = data.groupby('distrito', observed = True)
+
+        self.resumen = grupos.agg(alojamientos = ('propietario', 'size'), anfitriones = ('propietario', 'nunique'),
+                                  precio_persona = ('precio_persona', 'mean'))
+
+        # La media de alojamientos por anfitrion es el numero de alojamientos entre el numero de anfitriones del distrito
+        self.resumen['media_alojamientos'] = self.resumen.alojamientos / self.resumen.anfitriones
+
+        self.tipos = grupos.tipo_alojamiento.value_counts(normalize = True).unstack() * 100
+
+'''
+@param string nombre: nombre del atributo del modulo
+@description Los alojamientos del FICHERO (data) se leen la primera vez que se usan y no al importar el modulo
+'''
+def __getattr__(nombre):
+    if nombre == 'data':
+        globals()['data'] = cargarAlojamientos(FICHERO)
+        return globals()['data']
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, nombre))
 
 
 ####################################### - FUNCIONES - ##################################################################
 '''
-@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento.
+@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento, o IndiceAlojamientos del data frame.
 @param distritos: Es una lista con los nombres de los distritos. 
 @description Función que devuelve una serie con el porcentaje de tipos de alojamientos en una lista de distritos dada.
 @return Una serie con el porcentaje de tipos de alojamientos en los distritos dados.
 '''
+@medir
 def tiposAlojamientoDistrito(alojamientos, distritos):
 
+    # Con el indice los tipos de cada distrito ya estan contados, solo hay que sumar los distritos pedidos
+    if isinstance(alojamientos, IndiceAlojamientos):
+        alojamientos = alojamientos.conteoTipos(distritos)
+        return (alojamientos / alojamientos.sum() * 100).rename('proportion')
+
     # Filtramos los alojamientos a los distritos seleccionados cogiendo los alojamientos que estan dentro de los distritos que le pasamos
     # poniendo alojamientos.distritos obtenemos el distrito de cada alojamiento de la lista, y comprabamos si estan en la lista pasada
     # como argumentos
@@ -66,22 +360,29 @@ def tiposAlojamientoDistrito(alojamientos, distritos):
     # normalize hace el porcentajes en valores de 0 a 1 y lo multiplicampos por 100 para devolver el porcentaje real
     alojamientos = alojamientos.tipo_alojamiento.value_counts(normalize = True) * 100
 
-    return alojamientos
+    # Como tipo_alojamiento es una categoria, value_counts tambien devuelve los tipos que no estan en estos distritos, los quitamos
+    return alojamientos[alojamientos > 0]
 
 '''
-@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento.
+@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento, o IndiceAlojamientos del data frame.
 @param distritos: Es una lista con los nombres de los distritos. 
 @description Crear una función que reciba una lista de distritos y devuelva un diccionario con el número de alojamientos 
             que cada anfitrión ofrece en esos distrito, ordenado de más a menos alojamientos.
 @return devuelva un diccionario con el número de alojamientos que cada anfitrión ofrece en esos distrito, ordenado de más a menos alojamientos.
 '''
+@medir
 def alojamientosPropietariosDistritos(alojamientos, distritos):
 
-    #Primero filtramos los alojamientos por los distritos seleccionados
-    alojamientos = alojamientos[alojamientos.distrito.isin(distritos)]
+    # Con el indice los alojamientos de cada propietario en cada distrito ya estan contados
+    if isinstance(alojamientos, IndiceAlojamientos):
+        alojamientos = alojamientos.conteoPropietarios(distritos).rename('count')
 
-    #Seleccionamos el numero de apartamentos que tiene cada propietario en los distritos seleccionados
-    alojamientos = alojamientos.propietario.value_counts()
+    else:
+        #Primero filtramos los alojamientos por los distritos seleccionados
+        alojamientos = alojamientos[alojamientos.distrito.isin(distritos)]
+
+        #Seleccionamos el numero de apartamentos que tiene cada propietario en los distritos seleccionados
+        alojamientos = alojamientos.propietario.value_counts()
 
     #Y finalmente ordenamos de mayor a menor numero de propiedades
     alojamientos = alojamientos.sort_values(ascending = True)
@@ -89,15 +390,20 @@ def alojamientosPropietariosDistritos(alojamientos, distritos):
     return alojamientos
 
 '''
-@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento.
+@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento, o EstadisticasDistritos del data frame.
 @param distritos: Es una lista con los nombres de los distritos. 
 @description Crear una función que reciba una lista de alojamientos devuelva un diccionario con el número medio de alojamientos por anfitrión de cada distrito
 @return devuelva un diccionario con el número medio de alojamientos por anfitrión de cada distrito
 '''
+@medir
 def mediaAlojamientosDistrito(alojamientos):
 
+    # Con las estadisticas ya calculadas solo hay que cogerlas
+    if isinstance(alojamientos, EstadisticasDistritos):
+        return round(alojamientos.resumen.media_alojamientos.rename(None), 6)
+
     #Agrupamos los alojamientos por distrito con groupby
-    alojamientos = alojamientos.groupby('distrito')
+    alojamientos = alojamientos.groupby('distrito', observed = True)
 
     #Contamos las propiedades de cada propietario con value_counts de nuevo
     alojamientos = alojamientos.propietario.value_counts()
@@ -112,25 +418,478 @@ def mediaAlojamientosDistrito(alojamientos):
     return round(alojamientos, 6)
 
 
+####################################### - IDIOMAS - ####################################################################
+
+# Base de datos sqlite donde se guardan los idiomas ya detectados, por hash del nombre normalizado
+CACHE_IDIOMAS = 'idiomas.cache.sqlite3'
+
+# Numero de claves que se buscan en la cache en cada consulta (sqlite limita el numero de parametros)
+_CLAVES_CONSULTA = 500
+
+# Idioma que se pone a los nombres en los que langdetect no encuentra ningun idioma (por ejemplo solo numeros o emojis)
+SIN_IDIOMA = 'desconocido'
+
+'''
+@param Series nombres: nombres de los alojamientos
+@description Normaliza los nombres para que los que solo se diferencian en mayusculas o espacios se detecten una sola vez
+@return serie con los nombres normalizados
+'''
+def _normalizarNombres(nombres):
+    return nombres.astype('str').str.lower().str.split().str.join(' ')
+
+'''
+@param string nombre: nombre normalizado
+@return la clave del nombre en la cache de idiomas
+'''
+def _claveNombre(nombre):
+    return hashlib.sha1(nombre.encode('utf-8')).hexdigest()
+
+'''
+@param string rutaCache: base de datos sqlite de la cache de idiomas
+@param list claves: claves de los nombres que se buscan
+@description Busca en la cache solo las claves pedidas, sin leer el resto de la cache. Si la cache no existe se crea vacia
+@return diccionario con el idioma de las claves que estan en la cache
+'''
+def _leerIdiomas(rutaCache, claves):
+    encontrados = {}
+
+    with closing(sqlite3.connect(rutaCache)) as conexion:
+        conexion.execute('CREATE TABLE IF NOT EXISTS idiomas (clave TEXT PRIMARY KEY, idioma TEXT NOT NULL)')
+
+        for inicio in range(0, len(claves), _CLAVES_CONSULTA):
+            lote = claves[inicio:inicio + _CLAVES_CONSULTA]
+            consulta = 'SELECT clave, idioma FROM idiomas WHERE clave IN (%s)' % ','.join('?' * len(lote))
+            encontrados.update(conexion.execute(consulta, lote))
+
+    return encontrados
+
+'''
+@param string rutaCache: base de datos sqlite de la cache de idiomas
+@param dict idiomas: idioma de cada clave nueva
+@description Añade a la cache solo los idiomas nuevos, en una transaccion. Si otro proceso ya habia guardado una clave se
+            deja la que habia
+'''
+def _guardarIdiomas(rutaCache, idiomas):
+    with closing(sqlite3.connect(rutaCache, timeout = 30)) as conexion:
+        with conexion:
+            conexion.executemany('INSERT OR IGNORE INTO idiomas (clave, idioma) VALUES (?, ?)', idiomas.items())
+
+'''
+@param list nombres: lote de nombres normalizados
+@description Detecta el idioma de un lote de nombres en un proceso del pool. langdetect se importa aqui para que
+            importar el modulo no lo cargue, y se fija la semilla antes de detectar para que el resultado sea siempre
+            el mismo
+@return lista con el idioma de cada nombre
+'''
+def _detectarLote(nombres):
+    from langdetect import DetectorFactory, detect
+    from langdetect.lang_detect_exception import LangDetectException
+
+    DetectorFactory.seed = 0
+
+    idiomas = []
+
+    for nombre in nombres:
+        try:
+            idiomas.append(detect(nombre))
+        except LangDetectException:
+            idiomas.append(SIN_IDIOMA)
+
+    return idiomas
+
+'''
+@param alojamientos: data frame de alojamientos preprocesado
+@param string rutaCache: base de datos sqlite con los idiomas ya detectados, si es None no se usa cache
+@param int tamLote: numero de nombres de cada lote que se manda al pool
+@param int procesos: numero de procesos del pool, por defecto uno por nucleo
+@description Detecta el idioma del nombre de cada alojamiento. Los nombres se normalizan y se quitan los repetidos, los
+            que ya estan en la cache no se vuelven a detectar y el resto se detectan por lotes en un ProcessPoolExecutor
+            (si solo hay un lote se detecta en el propio proceso). De la cache solo se leen las claves de estos nombres y
+            solo se escriben los idiomas nuevos, asi que el coste no depende de lo grande que sea la cache.
+@return serie con el idioma del nombre de cada alojamiento, con el mismo indice que alojamientos
+'''
+@medir
+def idiomasNombres(alojamientos, rutaCache = CACHE_IDIOMAS, tamLote = 1000, procesos = None):
+
+    nombres = _normalizarNombres(alojamientos.nombre)
+    unicos = nombres.unique()
+    claves = [_claveNombre(nombre) for nombre in unicos]
+
+    # Buscamos en la cache los nombres de estos alojamientos, si no se puede leer (o esta corrupta) no se usa
+    cache = {}
+    if rutaCache is not None:
+        try:
+            cache = _leerIdiomas(rutaCache, list(dict.fromkeys(claves)))
+        except sqlite3.Error:
+            rutaCache = None
+
+    faltan = [(clave, nombre) for clave, nombre in zip(claves, unicos) if clave not in cache]
+
+    if faltan:
+        lotes = [[nombre for _, nombre in faltan[i:i + tamLote]] for i in range(0, len(faltan), tamLote)]
+
+        if len(lotes) == 1:
+            detectados = _detectarLote(lotes[0])
+        else:
+            with ProcessPoolExecutor(max_workers = min(procesos or os.cpu_count() or 1, len(lotes))) as pool:
+                detectados = [idioma for lote in pool.map(_detectarLote, lotes) for idioma in lote]
+
+        nuevos = dict(zip((clave for clave, _ in faltan), detectados))
+        cache.update(nuevos)
+
+        if rutaCache is not None:
+            try:
+                _guardarIdiomas(rutaCache, nuevos)
+            except sqlite3.Error as error:
+                print('WARNING: No se pudo guardar la cache de idiomas: %s' % error)
+
+    # Cada nombre repetido recibe el idioma de su nombre unico
+    return nombres.map(dict(zip(unicos, (cache[clave] for clave in claves)))).rename('idioma')
+
+'''
+@param alojamientos: data frame de alojamientos preprocesado
+@param Series idiomas: idioma de cada alojamiento (idiomasNombres)
+@param string grupo: columna por la que se agrupa, 'distrito' o 'propietario'
+@description Porcentaje de alojamientos de cada idioma en cada distrito o de cada anfitrion
+@return data frame con un grupo en cada fila y un idioma en cada columna
+'''
+@medir
+def idiomasPorGrupo(alojamientos, idiomas, grupo = 'distrito'):
+    return pd.crosstab(alojamientos[grupo], idiomas, normalize = 'index') * 100
+
+####################################### - CONCENTRACION - ##############################################################
+
+# Tipo de alojamiento de las viviendas completas
+VIVIENDA_COMPLETA = 'Entire home/apt'
+
+'''
+@param alojamientos: data frame de alojamientos preprocesado
+@param int topN: numero de anfitriones con mas alojamientos que se tienen en cuenta en cuotaTop
+@description Indicadores de concentracion de los alojamientos en pocos anfitriones para cada distrito. Se cuentan una sola
+            vez los alojamientos de cada anfitrion en cada distrito y con esos conteos ordenados por distrito se calcula todo
+            con operaciones de numpy sobre los arrays (bincount por distrito), sin recorrer los distritos uno a uno:
+            - gini: coeficiente de Gini del numero de alojamientos por anfitrion (0 si todos tienen los mismos)
+            - hhi: indice Herfindahl-Hirschman, suma de los cuadrados de la cuota de cada anfitrion (1 si solo hay uno)
+            - cuotaTop: porcentaje de alojamientos de los topN anfitriones con mas alojamientos
+            - cuotaCompletasMultiples: porcentaje de las viviendas completas que son de anfitriones con varios
+              alojamientos (en toda la ciudad)
+@return data frame con un distrito en cada fila y los indicadores en las columnas
+'''
+@medir
+def concentracionDistritos(alojamientos, topN = 10):
+
+    # Codigos de distrito y anfitrion de cada alojamiento
+    distritos, nombresDistritos = pd.factorize(alojamientos.distrito, sort = True)
+    propietarios, _ = pd.factorize(alojamientos.propietario)
+    numDistritos = len(nombresDistritos)
+
+    # Alojamientos de cada par distrito-anfitrion. Ordenando por distrito y numero de alojamientos cada distrito queda
+    # en un tramo seguido y dentro de el los anfitriones de menos a mas alojamientos
+    pares, cuentas = np.unique(np.stack([distritos, propietarios]), axis = 1, return_counts = True)
+    orden = np.lexsort((cuentas, pares[0]))
+    grupo, cuentas = pares[0][orden], cuentas[orden].astype('float64')
+
+    anfitriones = np.bincount(grupo, minlength = numDistritos)
+    total = np.bincount(grupo, weights = cuentas, minlength = numDistritos)
+    inicios = np.concatenate([[0], np.cumsum(anfitriones)[:-1]])
+
+    # Posicion (desde 1) de cada anfitrion dentro de su distrito, de menos a mas alojamientos
+    posicion = np.arange(len(cuentas)) - inicios[grupo] + 1
+
+    # Gini con los valores ordenados: 2 * sum(i * x_i) / (n * sum(x)) - (n + 1) / n
+    gini = 2 * np.bincount(grupo, weights = posicion * cuentas, minlength = numDistritos) / (anfitriones * total) - (anfitriones + 1) / anfitriones
+
+    hhi = np.bincount(grupo, weights = (cuentas / total[grupo]) ** 2, minlength = numDistritos)
+
+    # Los topN con mas alojamientos son los ultimos topN de cada tramo
+    top = posicion > anfitriones[grupo] - topN
+    cuotaTop = np.bincount(grupo[top], weights = cuentas[top], minlength = numDistritos) / total * 100
+
+    # Viviendas completas de anfitriones con varios alojamientos en toda la ciudad
+    multiples = np.bincount(propietarios)[propietarios] > 1
+    completas = (alojamientos.tipo_alojamiento == VIVIENDA_COMPLETA).to_numpy()
+    numCompletas = np.bincount(distritos[completas], minlength = numDistritos)
+
+    # Un distrito sin viviendas completas no tiene cuota (NaN), sin dividir 0 entre 0
+    cuotaCompletas = np.divide(np.bincount(distritos[completas & multiples], minlength = numDistritos), numCompletas,
+                               out = np.full(numDistritos, np.nan), where = numCompletas > 0) * 100
+
+    return pd.DataFrame({'anfitriones': anfitriones, 'alojamientos': total.astype('int64'), 'gini': gini, 'hhi': hhi,
+                         'cuotaTop': cuotaTop, 'cuotaCompletasMultiples': cuotaCompletas},
+                        index = pd.Index(nombresDistritos, name = 'distrito'))
+
+'''
+@param alojamientos: data frame de alojamientos preprocesado
+@param Series idiomas: idioma de cada alojamiento (idiomasNombres), si se pasa tambien cuenta el porcentaje de nombres en ingles
+@description Puntuacion de 0 a 1 de lo probable que es que cada anfitrion sea una empresa en lugar de un particular. Es la
+            media de varios indicadores entre 0 y 1 calculados con un solo groupby por anfitrion:
+            - alojamientos: (numero de alojamientos - 1) / 9, hasta 1 con 10 o mas alojamientos
+            - completas: porcentaje de sus alojamientos que son viviendas completas
+            - distritos: (numero de distritos - 1) / 4, hasta 1 con 5 o mas distritos
+            - ingles: porcentaje de sus alojamientos con el nombre en ingles (solo si se pasan los idiomas)
+@return data frame con un anfitrion en cada fila, los indicadores y la puntuacion, de mayor a menor puntuacion
 '''
-@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento.
+@medir
+def puntuacionOperadores(alojamientos, idiomas = None):
+
+    columnas = {'propietario': alojamientos.propietario, 'distrito': alojamientos.distrito,
+                'completa': alojamientos.tipo_alojamiento == VIVIENDA_COMPLETA}
+    if idiomas is not None:
+        columnas['ingles'] = idiomas == 'en'
+
+    grupos = pd.DataFrame(columnas).groupby('propietario')
+
+    agregados = {'alojamientos': ('completa', 'size'), 'completas': ('completa', 'mean'), 'distritos': ('distrito', 'nunique')}
+    if idiomas is not None:
+        agregados['ingles'] = ('ingles', 'mean')
+
+    operadores = grupos.agg(**agregados)
+
+    indicadores = pd.DataFrame({'alojamientos': ((operadores.alojamientos - 1) / 9).clip(upper = 1),
+                                'completas': operadores.completas,
+                                'distritos': ((operadores.distritos - 1) / 4).clip(upper = 1)})
+    if idiomas is not None:
+        indicadores['ingles'] = operadores.ingles
+
+    operadores['puntuacion'] = indicadores.mean(axis = 1)
+
+    return operadores.sort_values('puntuacion', ascending = False)
+
+####################################### - GEOGRAFIA - ##################################################################
+
+# Radio medio de la Tierra en metros
+RADIO_TIERRA = 6371008.8
+
+'''
+@param lat1, lon1: latitud y longitud en grados del primer punto (o arrays de puntos)
+@param lat2, lon2: latitud y longitud en grados del segundo punto (o arrays de puntos)
+@return distancia en metros entre los puntos con la formula del haversine
+'''
+def _distancia(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA * np.arcsin(np.sqrt(a))
+
+'''
+@param data frame data: data frame de alojamientos preprocesado
+@param float tamCelda: lado de cada celda de la rejilla en metros
+@description Indice espacial de los alojamientos en una rejilla uniforme sobre la latitud y la longitud. Las coordenadas se
+            pasan a metros con una proyeccion equirectangular centrada en los alojamientos (suficiente a escala de una
+            ciudad), cada alojamiento se asigna a una celda y las posiciones se ordenan por celda, de tal manera que las
+            celdas de una misma fila de la rejilla quedan seguidas. Una consulta solo mira las celdas que toca, con un
+            corte por fila de la rejilla, y calcula la distancia exacta (haversine) solo con esos alojamientos.
+'''
+class RejillaAlojamientos:
+
+    def __init__(self, data, tamCelda = 250):
+        self.data = data
+        self.tamCelda = tamCelda
+
+        self.latitudes = data.latitud.to_numpy(dtype = 'float64')
+        self.longitudes = data.longitud.to_numpy(dtype = 'float64')
+
+        # Origen de la proyeccion y metros por grado de longitud a la latitud media
+        self.latMin = self.latitudes.min() if len(data) else 0
+        self.lonMin = self.longitudes.min() if len(data) else 0
+        self.metrosGrado = np.radians(1) * RADIO_TIERRA
+        self.metrosGradoLon = self.metrosGrado * np.cos(np.radians(self.latitudes.mean() if len(data) else 0))
+
+        filas, columnas = self._celda(self.latitudes, self.longitudes)
+        self.numFilas, self.numColumnas = int(filas.max(initial = 0)) + 1, int(columnas.max(initial = 0)) + 1
+
+        celdas = filas * self.numColumnas + columnas
+        self.orden = np.argsort(celdas, kind = 'stable')
+        self.inicios = np.searchsorted(celdas[self.orden], np.arange(self.numFilas * self.numColumnas + 1))
+
+    '''
+    @param lat, lon: latitud y longitud en grados (o arrays)
+    @return fila y columna de la rejilla de cada punto (pueden quedar fuera de la rejilla)
+    '''
+    def _celda(self, lat, lon):
+        fila = np.floor((np.asarray(lat) - self.latMin) * self.metrosGrado / self.tamCelda).astype('int64')
+        columna = np.floor((np.asarray(lon) - self.lonMin) * self.metrosGradoLon / self.tamCelda).astype('int64')
+        return fila, columna
+
+    '''
+    @param latMin, latMax, lonMin, lonMax: limites en grados
+    @return posiciones de los alojamientos de las celdas que tocan el rectangulo
+    '''
+    def _candidatos(self, latMin, latMax, lonMin, lonMax):
+        (fila0, fila1), (columna0, columna1) = self._celda([latMin, latMax], [lonMin, lonMax])
+
+        fila0, fila1 = max(fila0, 0), min(fila1, self.numFilas - 1)
+        columna0, columna1 = max(columna0, 0), min(columna1, self.numColumnas - 1)
+
+        if fila0 > fila1 or columna0 > columna1:
+            return self.orden[:0]
+
+        # Las celdas de cada fila de la rejilla son un tramo seguido del orden
+        tramos = [self.orden[self.inicios[fila * self.numColumnas + columna0]:self.inicios[fila * self.numColumnas + columna1 + 1]]
+                  for fila in range(fila0, fila1 + 1)]
+
+        return np.concatenate(tramos)
+
+    '''
+    @param float lat, lon: centro en grados
+    @param float metros: radio en metros
+    @return posiciones de los alojamientos a menos de metros del centro y su distancia
+    '''
+    def _radio(self, lat, lon, metros):
+        dLat = metros / self.metrosGrado
+        dLon = metros / (self.metrosGrado * max(np.cos(np.radians(lat)), 1e-12))
+
+        candidatos = self._candidatos(lat - dLat, lat + dLat, lon - dLon, lon + dLon)
+        distancias = _distancia(lat, lon, self.latitudes[candidatos], self.longitudes[candidatos])
+        dentro = distancias <= metros
+
+        return candidatos[dentro], distancias[dentro]
+
+    '''
+    @param float lat, lon: centro en grados
+    @param float metros: radio en metros
+    @return data frame con los alojamientos a menos de metros del centro, en el orden del data frame
+    '''
+    def radio(self, lat, lon, metros):
+        posiciones, _ = self._radio(lat, lon, metros)
+        return self.data.iloc[np.sort(posiciones)]
+
+    '''
+    @param float latMin, latMax, lonMin, lonMax: limites del rectangulo en grados
+    @return data frame con los alojamientos dentro del rectangulo, en el orden del data frame
+    '''
+    def rectangulo(self, latMin, latMax, lonMin, lonMax):
+        candidatos = self._candidatos(latMin, latMax, lonMin, lonMax)
+        lat, lon = self.latitudes[candidatos], self.longitudes[candidatos]
+
+        dentro = (lat >= latMin) & (lat <= latMax) & (lon >= lonMin) & (lon <= lonMax)
+        return self.data.iloc[np.sort(candidatos[dentro])]
+
+    '''
+    @param float lat, lon: punto en grados
+    @param int k: numero de alojamientos
+    @description Busca en un radio que empieza en una celda y se va duplicando hasta tener k alojamientos; como se busca por
+                radio y no por celdas, los k mas cercanos de ese radio son los k mas cercanos de todos
+    @return data frame con los k alojamientos mas cercanos, de mas cerca a mas lejos, con su distancia en la columna distancia
+    '''
+    def cercanos(self, lat, lon, k):
+        k = min(k, len(self.data))
+        metros = self.tamCelda
+
+        posiciones, distancias = self._radio(lat, lon, metros)
+
+        # Como mucho hasta cubrir toda la rejilla, y si aun asi no hay k (el punto esta muy lejos) se miran todos
+        maximo = (self.numFilas + self.numColumnas) * self.tamCelda
+        while len(posiciones) < k and metros < maximo:
+            metros *= 2
+            posiciones, distancias = self._radio(lat, lon, metros)
+
+        if len(posiciones) < k:
+            posiciones = np.arange(len(self.data))
+            distancias = _distancia(lat, lon, self.latitudes, self.longitudes)
+
+        orden = np.argsort(distancias, kind = 'stable')[:k]
+        return self.data.iloc[posiciones[orden]].assign(distancia = distancias[orden])
+
+    '''
+    @return data frame con el numero de alojamientos de cada celda, con la latitud del centro de la celda en las filas
+            (de sur a norte) y la longitud en las columnas (de oeste a este)
+    '''
+    def densidad(self):
+        conteo = np.diff(self.inicios).reshape(self.numFilas, self.numColumnas)
+
+        latitudes = self.latMin + (np.arange(self.numFilas) + 0.5) * self.tamCelda / self.metrosGrado
+        longitudes = self.lonMin + (np.arange(self.numColumnas) + 0.5) * self.tamCelda / self.metrosGradoLon
+
+        return pd.DataFrame(conteo, index = pd.Index(latitudes, name = 'latitud'), columns = pd.Index(longitudes, name = 'longitud'))
+
+####################################### - GRAFICAS - ###################################################################
+
+# Version de las graficas. Si se cambia como se dibuja alguna hay que subirla para que se vuelvan a dibujar todas
+VERSION_GRAFICAS = 1
+
+'''
+@param string ruta: ruta del png
+@param datos: serie o data frame con los datos que se dibujan
+@param parametros: resto de valores de los que depende la grafica (titulo, distritos...)
+@description Calcula la clave de una grafica con el hash de los datos que se dibujan y sus parametros, y la compara con la
+            que se guardo en ruta.hash al dibujarla la ultima vez
+@return la clave de la grafica y si el png ya esta dibujado con esos mismos datos
+'''
+def _claveGrafica(ruta, datos, *parametros):
+    resumen = hashlib.sha1(repr((VERSION_GRAFICAS, list(datos.columns) if hasattr(datos, 'columns') else datos.name,
+                                 parametros)).encode())
+    resumen.update(pd.util.hash_pandas_object(datos, index = True).to_numpy().tobytes())
+    clave = resumen.hexdigest()
+
+    try:
+        with open(ruta + '.hash') as fichero:
+            actualizada = fichero.read() == clave and os.path.exists(ruta)
+    except OSError:
+        actualizada = False
+
+    if actualizada:
+        print('SUCCESS: Figura sin cambios, no se vuelve a dibujar')
+
+    return clave, actualizada
+
+'''
+@param float ancho: ancho de la figura en pulgadas
+@param float alto: alto de la figura en pulgadas
+@description Crea una figura de matplotlib con el backend Agg sin pasar por pyplot, de tal manera que no se comparte estado
+            global entre graficas (y se pueden dibujar varias a la vez) ni hace falta pantalla. matplotlib se importa la
+            primera vez que se dibuja una grafica.
+@return la figura y sus ejes
+'''
+def _figura(ancho = 15, alto = 15):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize = (ancho, alto))
+    FigureCanvasAgg(fig)
+
+    return fig, fig.add_subplot()
+
+'''
+@param Figure fig: figura a guardar
+@param string ruta: ruta del png
+@param string clave: clave de la grafica (_claveGrafica)
+@description Guarda la figura y su clave, y la libera en ese momento en lugar de esperar al recolector de basura
+'''
+def _guardarFigura(fig, ruta, clave):
+    with etapa('functionsPandas.savefig'):
+        fig.savefig(ruta)
+    fig.clear()
+
+    with open(ruta + '.hash', 'w') as fichero:
+        fichero.write(clave)
+
+    print('SUCCESS: Figura guardada correctamente')
+
+'''
+@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento, o IndiceAlojamientos del data frame,
+            o la serie de tiposAlojamientoDistrito ya calculada para esos distritos.
 @param distritos: Es una lista con los nombres de los distritos. 
+@param string ruta: ruta del png
 @description Crear una función que reciba una lista de distritos y dibuje un diagrama de sectores con los porcentajes de tipos de alojamientos en esos distritos.
 @return devuelva un png con un diagrama de sectores
 '''
-def diagramaPieTipos (alojamientos, distritos):
+@medir
+def diagramaPieTipos (alojamientos, distritos, ruta = 'TiposAlojamientoPorDistito.png'):
 
-    #definimos la figura y los ejes del grafico
-    fig, ax = plt.subplots()
+    #llamamos a la funcion tiposAlojamientoDistrito para que nos de los tipos de alojamiento por distrito, si no nos la pasan ya calculada
+    if not isinstance(alojamientos, pd.Series):
+        alojamientos = tiposAlojamientoDistrito(alojamientos,distritos)
 
-    # ajustamos el tamaño de la figura
-    fig.set_size_inches(15, 15)
+    # Si el png ya tiene estos mismos datos no lo volvemos a dibujar
+    clave, actualizada = _claveGrafica(ruta, alojamientos, distritos)
+    if actualizada:
+        return
 
-    #llamamos a la funcion tiposAlojamientoDistrito para que nos de los tipos de alojamiento por distrito
-    alojamientos = tiposAlojamientoDistrito(alojamientos,distritos)
+    #definimos la figura y los ejes del grafico
+    fig, ax = _figura()
 
     #Dibujamos el diagrama de sectores
-    alojamientos.plot(kind = 'pie')
+    alojamientos.plot(kind = 'pie', ax = ax)
 
     # Ponermos el título, con el + ', ' .join(distritos) imprimo los distritos que se le pasa
     ax.set_title('Distribución del porcentaje de tipos de alojamientos\n Distritos de ' + ', '.join(distritos), loc = "center")
@@ -139,30 +898,37 @@ def diagramaPieTipos (alojamientos, distritos):
     ax.set_ylabel('')
 
     #Guardamos la figura
-    plt.savefig('TiposAlojamientoPorDistito.png')
-
-    print('SUCCESS: Figura guardada correctamente')
+    _guardarFigura(fig, ruta, clave)
 
     return
 
 '''
-@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento.
+@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento, o EstadisticasDistritos del data frame.
+@param string ruta: ruta del png
 @description Crear una función que dibuje un diagrama de barras con el número de alojamientos por distritos.
 @return devuelva un png con un diagrama de sectores
 '''
-def NumAlojamientosDistrito(alojamientos):
+@medir
+def NumAlojamientosDistrito(alojamientos, ruta = 'CantidadAlojamientosDistrito.png'):
 
     # definimos una lista de colores
     colors = ['blue', 'green', 'red', 'purple', 'orange']
 
-    #definimos la figura y los ejes del grafico
-    fig, ax = plt.subplots()
+    # Contamos los alojamientos de cada distrito, con las estadisticas ya estan contados
+    if isinstance(alojamientos, EstadisticasDistritos):
+        alojamientos = alojamientos.resumen.alojamientos.sort_values(ascending = False)
+    else:
+        alojamientos = alojamientos.distrito.value_counts()
+
+    clave, actualizada = _claveGrafica(ruta, alojamientos)
+    if actualizada:
+        return
 
-    # ajustamos el tamaño de la figura
-    fig.set_size_inches(15, 15)
+    #definimos la figura y los ejes del grafico
+    fig, ax = _figura()
 
     #Dibujamos el diagrama de barras
-    alojamientos.distrito.value_counts().plot(kind = 'bar', color = colors)
+    alojamientos.plot(kind = 'bar', color = colors, ax = ax)
 
     # Ponermos el título, con el + ', ' .join(distritos) imprimo los distritos que se le pasa
     ax.set_title('Numero de alojamientos por distrito', loc = 'center')
@@ -171,34 +937,35 @@ def NumAlojamientosDistrito(alojamientos):
     ax.grid(axis = 'y', color = 'lightgray', linestyle = 'dashed')
 
     #Guardamos la figura
-    plt.savefig('CantidadAlojamientosDistrito.png')
-
-    print('SUCCESS: Figura guardada correctamente')
+    _guardarFigura(fig, ruta, clave)
 
     return
 
 
 '''
-@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento.
+@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento, o EstadisticasDistritos del data frame.
+@param string ruta: ruta del png
 @description Crear una función que dibuje un diagrama de barras con los porcentajes acumulados de tipos de alojamientos por distritos.
 @return devuelva un png con un diagrama con los tipo
 '''
-def diagramaBarrasDistrito (alojamientos):
+@medir
+def diagramaBarrasDistrito (alojamientos, ruta = 'TiposAlojamientoDistritoBarras.png'):
 
-    # definimos una lista de colores
-    colors = ['blue', 'green', 'red', 'purple', 'orange']
-
-    #definimos la figura y los ejes del grafico
-    fig, ax = plt.subplots()
+    # Calculamos el pocentaje de los tipos alojamientos en cada distrito, con las estadisticas ya esta calculado
+    if isinstance(alojamientos, EstadisticasDistritos):
+        alojamientos = alojamientos.tipos
+    else:
+        alojamientos = (alojamientos.groupby('distrito', observed = True).tipo_alojamiento.value_counts(normalize = True) * 100).unstack()
 
-    #ajustamos el tamaño de la figura
-    fig.set_size_inches(15, 15)
+    clave, actualizada = _claveGrafica(ruta, alojamientos)
+    if actualizada:
+        return
 
-    # Calculamos el pocentaje de los tipos alojamientos en cada distrito
-    alojamientos = alojamientos.groupby('distrito').tipo_alojamiento.value_counts(normalize = True) * 100
+    #definimos la figura y los ejes del grafico
+    fig, ax = _figura()
 
     # Dibujamos el diagrama de barras
-    alojamientos.unstack().plot(kind = 'bar', stacked = True, ax = ax)
+    alojamientos.plot(kind = 'bar', stacked = True, ax = ax)
 
     # Ponermos el título, con el + ', ' .join(distritos) imprimo los distritos que se le pasa
     ax.set_title('Tipos de alojamiento por distrito', loc = 'center')
@@ -207,40 +974,46 @@ def diagramaBarrasDistrito (alojamientos):
     ax.grid(axis = 'y', color = 'lightgray', linestyle = 'dashed')
 
     # Añadimos la legenda
-    plt.legend(loc = 'best')
+    ax.legend(loc = 'best')
 
     # Eliminamos el eje y
     ax.set_xlabel('')
 
     #Guardamos la figura
-    plt.savefig('TiposAlojamientoDistritoBarras.png')
-
-    print('SUCCESS: Figura guardada correctamente')
+    _guardarFigura(fig, ruta, clave)
 
     return
 
 
 '''
-@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento.
+@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento, o EstadisticasDistritos del data frame.
+@param string ruta: ruta del png
 @description Crear una función que dibuje un diagrama de barras con los precios medios por persona y día de cada distrito.
 @return devuelva un png con un diagrama de barras
 '''
-def diagramaBarrasPrecioPersona (alojamientos):
+@medir
+def diagramaBarrasPrecioPersona (alojamientos, ruta = 'PreciosDistrito.png'):
 
     # definimos una lista de colores
     colors = ['blue', 'green', 'red', 'purple', 'orange']
 
-    #definimos la figura y los ejes del grafico
-    fig, ax = plt.subplots()
+    # Con las estadisticas la media ya esta calculada
+    if isinstance(alojamientos, EstadisticasDistritos):
+        alojamientos = alojamientos.resumen.precio_persona
+
+    else:
+        #Agrupamos los alojamientos por distrito y calculamos la media ( recorddemos que .mean() nos calcula la media aritmetica )
+        alojamientos = alojamientos.groupby('distrito', observed = True)['precio_persona'].mean()
 
-    #ajustamos el tamaño de la figura
-    fig.set_size_inches(15, 15)
+    clave, actualizada = _claveGrafica(ruta, alojamientos)
+    if actualizada:
+        return
 
-    # Agrupamos los alojamientos por distrito
-    alojamientos = alojamientos.groupby('distrito')
+    #definimos la figura y los ejes del grafico
+    fig, ax = _figura()
 
-    #realizamos la grafica ( recorddemos que .mean() nos calcula la media aritmetica  )
-    alojamientos = alojamientos['precio_persona'].mean().plot(kind = 'bar', color = colors)
+    #realizamos la grafica
+    alojamientos.plot(kind = 'bar', color = colors, ax = ax)
 
     # Ponermos el título, con el + ', ' .join(distritos) imprimo los distritos que se le pasa
     ax.set_title('Precio medio persona', loc = 'center')
@@ -249,35 +1022,43 @@ def diagramaBarrasPrecioPersona (alojamientos):
     ax.grid(axis = 'y', color = 'lightgray', linestyle = 'dashed')
 
     #Guardamos la figura
-    plt.savefig('PreciosDistrito.png')
-
-    print('SUCCESS: Figura guardada correctamente')
+    _guardarFigura(fig, ruta, clave)
 
     return
 
 '''
-@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento.
+@param alojamientos: Es una lista de diccionarios, donde cada diccionario contiene los datos de un alojamiento, o IndiceAlojamientos del data frame.
+            Un data frame sin la columna distrito se toma como ya filtrado a esos distritos (solo precio_persona y puntuacion).
 @param distritos: Es una lista con los nombres de los distritos. 
+@param string ruta: ruta del png
 @description Crear una función que reciba una lista de distritos y dibuje un gráfico de dispersión con el coste mínimo por noche 
             y persona y la puntuación en esos distritos.
 @return devuelva un png con un diagrama de barras
 '''
-def diagramaDispersionCosteMin (alojamientos, distritos):
+@medir
+def diagramaDispersionCosteMin (alojamientos, distritos, ruta = 'PreciosPuntuacionDistritos.png'):
     # Creamos una lista de colores para los puntos
-    colors = ['aquamarine', 'navy', 'cyan', 'lightseagreen', 'darkviolet']
+    colors = np.array(['aquamarine', 'navy', 'cyan', 'lightseagreen', 'darkviolet'])
 
-    #definimos la figura y los ejes del grafico
-    fig, ax = plt.subplots()
+    #filtramos la lista de alojamientos a los distritos seleccionados, con el indice sin recorrer todo el data frame
+    if isinstance(alojamientos, IndiceAlojamientos):
+        alojamientos = alojamientos.filas(distritos)
+    elif 'distrito' in alojamientos.columns:
+        alojamientos = alojamientos[alojamientos.distrito.isin(distritos)]
 
+    # Nos quedamos solo con lo que se dibuja, el precio por persona ya se calculo al preprocesar
+    alojamientos = alojamientos[['precio_persona', 'puntuacion']]
 
-    #filtramos la lista de alojamientos a los distritos seleccionados
-    alojamientos = alojamientos[alojamientos.distrito.isin(distritos)]
+    clave, actualizada = _claveGrafica(ruta, alojamientos, distritos)
+    if actualizada:
+        return
 
-    # Repite la lista de colores en bloques de 5 para poder meterlos en el grafico de diperssion
-    colors = (colors * (len(alojamientos) // 5 + 1))[:len(alojamientos)]
+    #definimos la figura y los ejes del grafico, con el tamaño por defecto de matplotlib
+    fig, ax = _figura(6.4, 4.8)
 
-    # Calculamos el precio por persona
-    alojamientos['precio_persona'] = (alojamientos.precio * alojamientos.noches_minimas + alojamientos.gastos_limpieza) / (alojamientos.noches_minimas + alojamientos.plazas)
+    # Repite los colores en bloques de 5 para poder meterlos en el grafico de dispersion, indexando el array de colores
+    # en lugar de construir una lista de Python tan larga como los datos
+    colors = colors[np.arange(len(alojamientos)) % len(colors)]
 
     #utlizamos .scatter() para hacer un diagrama de dispersion de la lista de alojamientos
     ax.scatter(x = alojamientos['precio_persona'], y = alojamientos['puntuacion'], c = colors)
@@ -289,21 +1070,103 @@ def diagramaDispersionCosteMin (alojamientos, distritos):
     ax.grid(axis = 'y', color = 'lightgray', linestyle = 'dashed')
     ax.grid(axis = 'x', color='lightgray', linestyle='dashed')
 
-    # Añadimos la legenda
-    plt.legend(loc = 'best')
-
     #Ponemos nombre a x e y
     ax.set_xlabel('Precio'); ax.set_ylabel('Puntuacion')
 
     #Guardamos la figura
-    plt.savefig('PreciosPuntuacionDistritos.png')
+    _guardarFigura(fig, ruta, clave)
 
-    print('SUCCESS: Figura guardada correctamente')
+    return
+
+'''
+@param alojamientos: data frame de alojamientos preprocesado o RejillaAlojamientos del data frame
+@param float tamCelda: lado de cada celda en metros (si se pasa un data frame)
+@param string ruta: ruta del png
+@description Dibuja un mapa de calor con el numero de alojamientos de cada celda de la rejilla
+@return devuelva un png con un mapa de calor
+'''
+@medir
+def diagramaDensidad(alojamientos, tamCelda = 250, ruta = 'DensidadAlojamientos.png'):
+
+    if not isinstance(alojamientos, RejillaAlojamientos):
+        alojamientos = RejillaAlojamientos(alojamientos, tamCelda)
+
+    densidad = alojamientos.densidad()
+
+    clave, actualizada = _claveGrafica(ruta, densidad)
+    if actualizada:
+        return
+
+    #definimos la figura y los ejes del grafico
+    fig, ax = _figura()
+
+    # Dibujamos el numero de alojamientos de cada celda, con el sur abajo
+    extension = [densidad.columns[0], densidad.columns[-1], densidad.index[0], densidad.index[-1]]
+    imagen = ax.imshow(densidad.to_numpy(), origin = 'lower', extent = extension, aspect = 'auto', cmap = 'hot')
+    fig.colorbar(imagen, ax = ax, label = 'Alojamientos')
+
+    ax.set_title('Densidad de alojamientos', loc = 'center')
+    ax.set_xlabel('Longitud'); ax.set_ylabel('Latitud')
+
+    #Guardamos la figura
+    _guardarFigura(fig, ruta, clave)
 
     return
 
-diagramaDispersionCosteMin(data, ['Centro','Villaverde', 'Vicálvaro'])
-diagramaBarrasPrecioPersona(data)
-diagramaBarrasDistrito(data)
-diagramaPieTipos(data,['Centro','Villaverde', 'Vicálvaro'])
-NumAlojamientosDistrito(data)
\ No newline at end of file
+'''
+@param string funcion: nombre de la funcion que dibuja la grafica
+@param argumentos: argumentos de la funcion
+@description Dibuja una grafica en un proceso del pool
+'''
+def _dibujarGrafica(funcion, *argumentos):
+    globals()[funcion](*argumentos)
+
+'''
+@param data frame data: data frame de alojamientos preprocesado
+@param distritos: lista con los nombres de los distritos de las graficas por distritos
+@param int procesos: numero de procesos del pool, por defecto uno por grafica (como mucho uno por nucleo)
+@description Dibuja las cinco graficas a la vez, cada una en un proceso del pool. Lo que se dibuja se calcula antes en
+            este proceso y a cada grafica solo se le manda lo suyo: las estadisticas por distrito (que se calculan una sola
+            vez), los porcentajes de tipos de los distritos y las dos columnas del diagrama de dispersion de esos
+            distritos, en lugar de copiar el data frame entero a cada proceso. Con un solo proceso se dibujan aqui mismo
+'''
+@medir
+def dibujarGraficas(data, distritos, procesos = None):
+
+    estadisticas = EstadisticasDistritos(data)
+    dispersion = data.loc[data.distrito.isin(distritos), ['precio_persona', 'puntuacion']]
+
+    graficas = [('diagramaDispersionCosteMin', dispersion, distritos), ('diagramaBarrasPrecioPersona', estadisticas),
+                ('diagramaBarrasDistrito', estadisticas), ('diagramaPieTipos', tiposAlojamientoDistrito(data, distritos), distritos),
+                ('NumAlojamientosDistrito', estadisticas)]
+
+    procesos = min(procesos or os.cpu_count() or 1, len(graficas))
+
+    if procesos == 1:
+        for grafica in graficas:
+            _dibujarGrafica(*grafica)
+        return
+
+    with ProcessPoolExecutor(max_workers = procesos) as pool:
+        futuros = [pool.submit(_dibujarGrafica, *grafica) for grafica in graficas]
+
+        # Esperamos a que terminen todas, si alguna falla salta aqui su excepcion
+        for futuro in futuros:
+            futuro.result()
+
+'''
+@description Dibuja todas las graficas del FICHERO. Solo se ejecuta al lanzar el script (python functionsPandas.py), no al importarlo
+'''
+def main():
+
+    try:
+        data = cargarAlojamientos(FICHERO)
+
+    except FileNotFoundError:
+        print('ERROR: File not found')
+        return
+
+    dibujarGraficas(data, ['Centro','Villaverde', 'Vicálvaro'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+'''
+@company USC ETSE
+@description Generar ficheros de alojamientos sinteticos con el mismo formato que los de Inside Airbnb (separados por
+            tabuladores, precios como $1,234.00 y celdas vacias) para probar las funciones con muchos alojamientos.
+            Con la misma semilla siempre se genera el mismo fichero.
+'''
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Distritos de Madrid con su peso (cuantos alojamientos tiene cada uno respecto a los demas) y su centro aproximado
+DISTRITOS = {'Centro': (45, 40.4155, -3.7074), 'Salamanca': (7, 40.4300, -3.6780), 'Chamberí': (6, 40.4340, -3.7040),
+             'Arganzuela': (6, 40.3980, -3.6980), 'Tetuán': (4, 40.4600, -3.6980), 'Retiro': (4, 40.4110, -3.6760),
+             'Chamartín': (4, 40.4580, -3.6770), 'Moncloa - Aravaca': (3, 40.4350, -3.7300), 'Latina': (3, 40.4030, -3.7360),
+             'Carabanchel': (3, 40.3830, -3.7280), 'Ciudad Lineal': (3, 40.4480, -3.6500), 'Puente de Vallecas': (3, 40.3910, -3.6590),
+             'San Blas - Canillejas': (2, 40.4300, -3.6120), 'Usera': (2, 40.3840, -3.7060), 'Hortaleza': (1, 40.4740, -3.6410),
+             'Fuencarral - El Pardo': (1, 40.4980, -3.7310), 'Moratalaz': (1, 40.4070, -3.6440), 'Villaverde': (1, 40.3450, -3.7000),
+             'Barajas': (1, 40.4740, -3.5800), 'Villa de Vallecas': (1, 40.3730, -3.6210), 'Vicálvaro': (1, 40.4000, -3.6080)}
+
+# Tipos de alojamiento y su peso
+TIPOS = {'Entire home/apt': 60, 'Private room': 37, 'Shared room': 3}
+
+# Plantillas de los nombres, en varios idiomas como en el fichero real
+NOMBRES = ['Apartamento luminoso en {}', 'Cozy apartment in {}', 'Habitación tranquila en {}', 'Lovely room near {}',
+           'Piso reformado junto a {}', 'Charmant appartement à {}', 'Studio in the heart of {}', 'Ático con terraza en {}']
+
+# Porcentaje de celdas vacias en las columnas que pueden venir vacias
+VACIAS = {'price': 0.01, 'cleaning_fee': 0.3, 'review_scores_rating': 0.2, 'host_id': 0.001}
+
+'''
+@param Generator rng: generador de numeros aleatorios de numpy
+@param int n: numero de alojamientos
+@param int primerId: id del primer alojamiento
+@description Genera un bloque de alojamientos. La cantidad de alojamientos de cada anfitrion sigue una distribucion de
+            Zipf (la mayoria tienen uno y unos pocos tienen muchos), los precios una lognormal y la posicion de cada
+            alojamiento se reparte alrededor del centro de su distrito
+@return data frame con los alojamientos con las columnas del fichero
+'''
+def _bloque(rng, n, primerId):
+
+    nombresDistritos = list(DISTRITOS)
+    pesos = np.array([DISTRITOS[distrito][0] for distrito in nombresDistritos], dtype = 'float64')
+    distritos = rng.choice(len(nombresDistritos), size = n, p = pesos / pesos.sum())
+    centros = np.array([DISTRITOS[distrito][1:] for distrito in nombresDistritos])
+
+    tipos = np.array(list(TIPOS))
+    pesosTipos = np.array(list(TIPOS.values()), dtype = 'float64')
+
+    ids = np.arange(primerId, primerId + n)
+
+    # Numero de alojamientos de cada anfitrion con una Zipf: la mayoria tienen uno y unos pocos muchos (como mucho 500).
+    # Los ids de los anfitriones de cada bloque empiezan en el primer id del bloque para que no se repitan entre bloques
+    porAnfitrion = np.minimum(rng.zipf(2.2, size = n), 500)
+    anfitriones = np.repeat(primerId + np.arange(n), porAnfitrion)[:n]
+    anfitriones = anfitriones[rng.permutation(n)]
+
+    precios = np.round(np.exp(rng.normal(4.1, 0.6, size = n)))
+    limpieza = np.round(np.exp(rng.normal(3.2, 0.7, size = n)))
+
+    nombres = np.array(NOMBRES, dtype = object)[rng.integers(0, len(NOMBRES), size = n)]
+    nombres = [plantilla.format(nombresDistritos[distrito]) for plantilla, distrito in zip(nombres, distritos)]
+
+    bloque = pd.DataFrame({
+        'id': ids,
+        'listing_url': ['https://www.airbnb.com/rooms/%d' % i for i in ids],
+        'name': nombres,
+        'description': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8,
+        'amenities': '{TV,Wifi,"Air conditioning",Kitchen,Elevator,Heating,Washer}',
+        'host_id': anfitriones,
+        'neighbourhood': np.array(nombresDistritos, dtype = object)[distritos],
+        'neighbourhood_group_cleansed': np.array(nombresDistritos, dtype = object)[distritos],
+        'latitude': np.round(centros[distritos, 0] + rng.normal(0, 0.008, size = n), 6),
+        'longitude': np.round(centros[distritos, 1] + rng.normal(0, 0.01, size = n), 6),
+        'room_type': tipos[rng.choice(len(tipos), size = n, p = pesosTipos / pesosTipos.sum())],
+        'accommodates': rng.integers(1, 9, size = n),
+        'price': ['${:,.2f}'.format(precio) for precio in precios],
+        'cleaning_fee': ['${:,.2f}'.format(precio) for precio in limpieza],
+        'minimum_nights': np.minimum(rng.geometric(0.4, size = n), 365),
+        'review_scores_rating': rng.integers(60, 101, size = n).astype('float64')
+    })
+
+    # Vaciamos algunas celdas para que dropna tenga algo que quitar
+    for columna, porcentaje in VACIAS.items():
+        bloque[columna] = bloque[columna].astype(object).where(rng.random(n) >= porcentaje, None)
+
+    return bloque
+
+'''
+@param string ruta: ruta del fichero que se genera
+@param int filas: numero de alojamientos
+@param int semilla: semilla del generador de numeros aleatorios
+@param int tamBloque: numero de alojamientos que se generan y se escriben a la vez
+@description Genera un fichero de alojamientos sintetico escribiendolo por bloques, de tal manera que aunque tenga millones
+            de alojamientos nunca estan todos en memoria
+'''
+def generarFichero(ruta, filas, semilla = 0, tamBloque = 100000):
+
+    rng = np.random.default_rng(semilla)
+
+    for inicio in range(0, filas, tamBloque):
+        bloque = _bloque(rng, min(tamBloque, filas - inicio), inicio + 1)
+        bloque.to_csv(ruta, sep = '\t', index = False, mode = 'w' if inicio == 0 else 'a', header = inicio == 0)
+
+if __name__ == '__main__':
+    # python generador.py fichero.csv filas [semilla]
+    if len(sys.argv) not in (3, 4):
+        print('ERROR: uso python generador.py fichero.csv filas [semilla]')
+        sys.exit(1)
+
+    generarFichero(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) == 4 else 0)
+    print('SUCCESS: Fichero generado correctamente')
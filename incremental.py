@@ -0,0 +1,282 @@
+'''
+@company USC ETSE
+@description Actualizar los conteos de anfitriones y distritos de una fecha a la siguiente a partir solo de los
+            alojamientos que han cambiado, en lugar de volver a calcularlos con todos los alojamientos.
+'''
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import functionsPandas
+
+'''
+@param data frame data: data frame de alojamientos preprocesado (functionsPandas.cargarAlojamientos)
+@description Saca el id, el distrito y el anfitrion de cada alojamiento ordenados por id. Si un id aparece dos veces se
+            queda con la ultima. El distrito se devuelve como texto de cada categoria y el codigo de cada fila, sin pasar
+            cada fila a texto
+@return ids, nombres de los distritos, codigo del distrito de cada alojamiento y anfitriones
+'''
+def _filas(data):
+    distritos = pd.Categorical(data.distrito)
+    ids = data.id.to_numpy(dtype = 'int64')
+
+    # Ordenamos por id de forma estable y de cada id repetido nos quedamos con el ultimo
+    orden = np.argsort(ids, kind = 'stable')
+    ids = ids[orden]
+    ultimos = np.append(ids[1:] != ids[:-1], True) if len(ids) else np.zeros(0, dtype = bool)
+    orden = orden[ultimos]
+
+    return (ids[ultimos], [str(distrito) for distrito in distritos.categories],
+            distritos.codes[orden].astype('int32'), data.propietario.to_numpy(dtype = 'int64')[orden])
+
+'''
+@param dict diccionario: diccionario con los valores a actualizar
+@param clave: clave del diccionario
+@param int cambio: cantidad que se suma (o se resta si es negativa)
+@description Suma el cambio al valor de la clave y si se queda a 0 la quita
+@return el valor que tenia antes
+'''
+def _sumar(diccionario, clave, cambio):
+    antes = diccionario.get(clave, 0)
+
+    if antes + cambio:
+        diccionario[clave] = antes + cambio
+    else:
+        diccionario.pop(clave, None)
+
+    return antes
+
+'''
+@param data frame data: data frame de alojamientos preprocesado
+@param int umbral: numero de alojamientos a partir del cual se considera que un anfitrion tiene varios alojamientos
+@description Estado guardado de una fecha: el distrito y el anfitrion de cada alojamiento (ordenados por id), el numero de
+            alojamientos de cada anfitrion en cada distrito (conteo), el total de cada anfitrion (totales) y el total de
+            alojamientos y anfitriones de cada distrito. Con actualizar se pasa a la fecha siguiente aplicando a los conteos
+            solo los alojamientos añadidos, eliminados y cambiados, y los agregados (landlords, alojamientosDistritos,
+            alojamientosPropietariosDistritos y mediaAlojamientosDistrito) se calculan a partir de los conteos sin
+            recorrer los alojamientos.
+'''
+class EstadoAlojamientos:
+
+    def __init__(self, data, umbral = 2):
+        self.umbral = umbral
+        self.ids, self.nombresDistritos, self.distritos, self.propietarios = _filas(data)
+
+        # Los conteos se calculan con un groupby solo al crear el estado, despues se actualizan con los cambios
+        conteo = pd.DataFrame({'distrito': np.array(self.nombresDistritos, dtype = object)[self.distritos],
+                               'propietario': self.propietarios}).groupby(['distrito', 'propietario']).size()
+        self._conteos(conteo.index.get_level_values('distrito'), conteo.index.get_level_values('propietario'), conteo.to_numpy())
+
+    '''
+    @param distritos, propietarios, cuentas: distrito, anfitrion y numero de alojamientos de cada entrada del conteo
+    @description Guarda el conteo y a partir de el los totales de cada anfitrion y de cada distrito
+    '''
+    def _conteos(self, distritos, propietarios, cuentas):
+        distritos, propietarios, cuentas = list(distritos), [int(p) for p in propietarios], [int(c) for c in cuentas]
+
+        self.conteo = dict(zip(zip(distritos, propietarios), cuentas))
+
+        totales = pd.Series(cuentas, dtype = 'int64')
+        self.totales = {int(p): int(c) for p, c in totales.groupby(np.array(propietarios, dtype = 'int64')).sum().items()} if cuentas else {}
+
+        porDistrito = totales.groupby(np.array(distritos, dtype = object))
+        self.totalesDistrito = {d: int(c) for d, c in porDistrito.sum().items()} if cuentas else {}
+        self.anfitrionesDistrito = {d: int(c) for d, c in porDistrito.size().items()} if cuentas else {}
+
+    '''
+    @param data frame data: data frame de alojamientos preprocesado de la fecha siguiente
+    @description Compara la nueva fecha con el estado guardado juntando los ids ordenados de las dos fechas con una busqueda
+                binaria, y aplica a los conteos solo las diferencias: resta los alojamientos eliminados y los cambiados tal
+                y como estaban, y suma los añadidos y los cambiados tal y como estan ahora. Un alojamiento cuenta como
+                cambiado si ha cambiado de distrito o de anfitrion. Solo se tocan las entradas del conteo y los totales de
+                los distritos y anfitriones que cambian
+    @return diccionario con los ids añadidos, eliminados y cambiados, los anfitriones que pasan a tener varios
+            alojamientos (nuevosMultiples) y los que dejan de tenerlos (dejanMultiples)
+    '''
+    def actualizar(self, data):
+
+        ids, nombres, codigos, propietarios = _filas(data)
+
+        # Pasamos los codigos de los distritos de la nueva fecha a los del estado, añadiendo los distritos nuevos
+        for nombre in nombres:
+            if nombre not in self.nombresDistritos:
+                self.nombresDistritos.append(nombre)
+        traduccion = np.array([self.nombresDistritos.index(nombre) for nombre in nombres], dtype = 'int32')
+        distritos = traduccion[codigos] if len(codigos) else codigos
+
+        # Posicion de cada id nuevo en los ids del estado
+        posiciones = np.minimum(np.searchsorted(self.ids, ids), max(len(self.ids) - 1, 0))
+        comunes = (self.ids[posiciones] == ids) if len(self.ids) else np.zeros(len(ids), dtype = bool)
+
+        siguen = np.zeros(len(self.ids), dtype = bool)
+        siguen[posiciones[comunes]] = True
+
+        anteriores = posiciones[comunes]
+        cambiados = np.flatnonzero(comunes)[(self.distritos[anteriores] != distritos[comunes]) |
+                                            (self.propietarios[anteriores] != propietarios[comunes])]
+
+        # Lo que se quita (eliminados y cambiados como estaban) y lo que se pone (añadidos y cambiados como estan ahora)
+        quitar = np.concatenate([np.flatnonzero(~siguen), posiciones[cambiados]])
+        poner = np.concatenate([np.flatnonzero(~comunes), cambiados])
+
+        cambios = pd.DataFrame({'distrito': np.concatenate([self.distritos[quitar], distritos[poner]]),
+                                'propietario': np.concatenate([self.propietarios[quitar], propietarios[poner]]),
+                                'cambio': np.concatenate([np.full(len(quitar), -1), np.full(len(poner), 1)])})
+        cambios = cambios.groupby(['distrito', 'propietario']).cambio.sum()
+
+        # Aplicamos los cambios solo a las entradas afectadas y guardamos el total anterior de cada anfitrion afectado
+        totalesAntes = {}
+        for (codigo, propietario), cambio in cambios[cambios != 0].items():
+            distrito, propietario = self.nombresDistritos[codigo], int(propietario)
+
+            antes = _sumar(self.conteo, (distrito, propietario), int(cambio))
+            despues = antes + int(cambio)
+
+            _sumar(self.totalesDistrito, distrito, int(cambio))
+            _sumar(self.anfitrionesDistrito, distrito, (despues > 0) - (antes > 0))
+
+            totalesAntes.setdefault(propietario, self.totales.get(propietario, 0))
+            _sumar(self.totales, propietario, int(cambio))
+
+        resultado = {
+            'añadidos': ids[~comunes].tolist(),
+            'eliminados': self.ids[~siguen].tolist(),
+            'cambiados': ids[cambiados].tolist(),
+            'nuevosMultiples': [anfitrion for anfitrion, antes in totalesAntes.items()
+                                if antes < self.umbral <= self.totales.get(anfitrion, 0)],
+            'dejanMultiples': [anfitrion for anfitrion, antes in totalesAntes.items()
+                               if self.totales.get(anfitrion, 0) < self.umbral <= antes]
+        }
+
+        self.ids, self.distritos, self.propietarios = ids, distritos, propietarios
+
+        return resultado
+
+    '''
+    @param anfitriones: lista de anfitriones, si es None se devuelven todos
+    @return diccionario con los anfitriones y el número de alojamientos que posee cada uno
+    '''
+    def landlords(self, anfitriones = None):
+        if anfitriones is None:
+            return dict(sorted(self.totales.items()))
+
+        return {int(anfitrion): self.totales[anfitrion] for anfitrion in sorted(set(anfitriones)) if anfitrion in self.totales}
+
+    '''
+    @return diccionario con el número de alojamientos en cada distrito
+    '''
+    def alojamientosDistritos(self):
+        return dict(sorted(self.totalesDistrito.items()))
+
+    '''
+    @param distritos: lista con los nombres de los distritos
+    @return serie con el número de alojamientos que cada anfitrión ofrece en esos distritos, de menos a más alojamientos
+    '''
+    def alojamientosPropietariosDistritos(self, distritos):
+        distritos = set(distritos)
+        conteo = {}
+
+        for (distrito, propietario), cuenta in self.conteo.items():
+            if distrito in distritos:
+                conteo[propietario] = conteo.get(propietario, 0) + cuenta
+
+        conteo = pd.Series(conteo, dtype = 'int64', name = 'count').rename_axis('propietario')
+        return conteo.sort_index().sort_values(ascending = True)
+
+    '''
+    @return serie con el número medio de alojamientos por anfitrión de cada distrito
+    '''
+    def mediaAlojamientosDistrito(self):
+        distritos = sorted(self.totalesDistrito)
+        media = pd.Series([self.totalesDistrito[d] / self.anfitrionesDistrito[d] for d in distritos],
+                          index = pd.Index(distritos, name = 'distrito'), dtype = 'float64')
+        return round(media, 6)
+
+    '''
+    @param string ruta: ruta del fichero donde se guarda el estado
+    @description Guarda el estado en formato Feather: en ruta el distrito y el anfitrion de cada alojamiento, y en
+                ruta.conteo el conteo de cada anfitrion en cada distrito y en ruta.totales el total de cada anfitrion, para
+                no tener que volver a contarlos al cargar el estado
+    '''
+    def guardar(self, ruta):
+        filas = pd.DataFrame({'id': self.ids, 'distrito': pd.Categorical.from_codes(self.distritos, self.nombresDistritos),
+                              'propietario': self.propietarios})
+
+        claves = list(self.conteo)
+        conteo = pd.DataFrame({'distrito': [distrito for distrito, _ in claves],
+                               'propietario': np.array([propietario for _, propietario in claves], dtype = 'int64'),
+                               'cuenta': np.array(list(self.conteo.values()), dtype = 'int64')})
+        totales = pd.DataFrame({'propietario': np.array(list(self.totales), dtype = 'int64'),
+                                'cuenta': np.array(list(self.totales.values()), dtype = 'int64')})
+
+        for tabla, destino in ((conteo, ruta + '.conteo'), (totales, ruta + '.totales'), (filas, ruta)):
+            tabla.to_feather(destino + '.tmp')
+            os.replace(destino + '.tmp', destino)
+
+    '''
+    @param string ruta: ruta del fichero donde se guardo el estado
+    @param int umbral: numero de alojamientos a partir del cual se considera que un anfitrion tiene varios alojamientos
+    @description Carga las filas y los conteos guardados sin volver a contar. Si el estado se guardo sin los conteos (con
+                una version anterior) se cuentan a partir de las filas
+    @return el EstadoAlojamientos guardado en la ruta
+    '''
+    @classmethod
+    def cargar(cls, ruta, umbral = 2):
+        filas = pd.read_feather(ruta)
+
+        if not (os.path.exists(ruta + '.conteo') and os.path.exists(ruta + '.totales')):
+            return cls(filas, umbral)
+
+        estado = cls.__new__(cls)
+        estado.umbral = umbral
+
+        distritos = pd.Categorical(filas.distrito)
+        estado.ids = filas.id.to_numpy(dtype = 'int64')
+        estado.nombresDistritos = [str(distrito) for distrito in distritos.categories]
+        estado.distritos = distritos.codes.astype('int32')
+        estado.propietarios = filas.propietario.to_numpy(dtype = 'int64')
+
+        conteo, totales = pd.read_feather(ruta + '.conteo'), pd.read_feather(ruta + '.totales')
+        cuentas = conteo.cuenta.to_numpy()
+
+        estado.conteo = dict(zip(zip(conteo.distrito.tolist(), conteo.propietario.tolist()), cuentas.tolist()))
+        estado.totales = dict(zip(totales.propietario.tolist(), totales.cuenta.tolist()))
+
+        # Los totales de los distritos salen del conteo con bincount, hay pocos distritos
+        codigos = pd.Categorical(conteo.distrito)
+        nombres = [str(distrito) for distrito in codigos.categories]
+        estado.totalesDistrito = dict(zip(nombres, np.bincount(codigos.codes, weights = cuentas, minlength = len(nombres)).astype('int64').tolist()))
+        estado.anfitrionesDistrito = dict(zip(nombres, np.bincount(codigos.codes, minlength = len(nombres)).tolist()))
+
+        return estado
+
+if __name__ == '__main__':
+    # python incremental.py estado.feather nuevo.csv: actualiza el estado guardado con una nueva fecha
+    if len(sys.argv) != 3:
+        print('ERROR: uso python incremental.py estado.feather fichero.csv')
+        sys.exit(1)
+
+    rutaEstado, rutaFichero = sys.argv[1:]
+
+    try:
+        data = functionsPandas.cargarAlojamientos(rutaFichero)
+
+    except FileNotFoundError:
+        print('ERROR: File not found')
+        sys.exit(1)
+
+    if os.path.exists(rutaEstado):
+        estado = EstadoAlojamientos.cargar(rutaEstado)
+        cambios = estado.actualizar(data)
+        print('SUCCESS: %d añadidos, %d eliminados, %d cambiados' % (len(cambios['añadidos']), len(cambios['eliminados']), len(cambios['cambiados'])))
+        print('Anfitriones que pasan a tener varios alojamientos:', cambios['nuevosMultiples'])
+        print('Anfitriones que dejan de tener varios alojamientos:', cambios['dejanMultiples'])
+
+    else:
+        estado = EstadoAlojamientos(data)
+        print('SUCCESS: Estado inicial con %d alojamientos' % len(estado.ids))
+
+    estado.guardar(rutaEstado)
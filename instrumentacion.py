@@ -0,0 +1,191 @@
+'''
+@company USC ETSE
+@description Medir cada etapa (lectura, consultas y graficas) de functions.py y functionsPandas.py: tiempo, filas, filas
+            eliminadas y memoria. Las medidas se escriben como una linea json por etapa. Esta desactivado por defecto y
+            se activa con activar() o con la variable de entorno AIRBNB_METRICAS (ruta del fichero de medidas, o - para
+            la salida de error). Con AIRBNB_PERFIL=etapa se guarda ademas un perfil de cProfile de esa etapa.
+'''
+
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:
+    # En Windows no existe resource, asi que no se mide el pico de memoria
+    resource = None
+
+# Configuracion de la medicion, None si esta desactivada
+_configuracion = None
+
+# Medidas de las etapas que se estan ejecutando en cada hilo, la ultima es la mas interna. Cada hilo tiene su propia pila
+# para que en el servicio (un hilo por peticion) las anotaciones de un hilo no acaben en la etapa de otro
+_hilo = threading.local()
+
+# Para que dos hilos no mezclen sus lineas al escribir las medidas
+_cerrojo = threading.Lock()
+
+'''
+@return pila de etapas del hilo actual
+'''
+def _pila():
+    if not hasattr(_hilo, 'pila'):
+        _hilo.pila = []
+
+    return _hilo.pila
+
+'''
+@param string ruta: fichero donde se añaden las medidas, o '-' para escribirlas en la salida de error
+@param string perfil: nombre de la etapa de la que se guarda un perfil de cProfile en <etapa>.prof, o None
+@description Activa la medicion de las etapas
+'''
+def activar(ruta = '-', perfil = None):
+    global _configuracion
+    _configuracion = {'ruta': ruta, 'perfil': perfil}
+
+'''
+@description Desactiva la medicion de las etapas
+'''
+def desactivar():
+    global _configuracion
+    _configuracion = None
+
+'''
+@return si la medicion esta activada
+'''
+def activa():
+    return _configuracion is not None
+
+'''
+@return memoria residente del proceso en MB, o None si no se puede saber (solo se lee en Linux)
+'''
+def memoriaResidente():
+    try:
+        with open('/proc/self/statm') as fichero:
+            return int(fichero.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+'''
+@return pico de memoria residente del proceso en MB desde que empezo, o None si no se puede saber
+'''
+def picoMemoria():
+    if resource is None:
+        return None
+
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # En Linux ru_maxrss esta en KB y en macOS en bytes
+    return pico / (2**20 if sys.platform == 'darwin' else 2**10)
+
+'''
+@param objeto: argumento o resultado de una etapa
+@return numero de filas del objeto si tiene longitud (data frame, serie, lista, tabla...), o None
+'''
+def _filas(objeto):
+    if isinstance(objeto, (str, bytes, dict)) or not hasattr(objeto, '__len__'):
+        return None
+
+    try:
+        return len(objeto)
+    except TypeError:
+        return None
+
+'''
+@param dict medida: medida de una etapa
+@description Escribe la medida como una linea json
+'''
+def _emitir(medida):
+    linea = json.dumps(medida, ensure_ascii = False, default = str) + '\n'
+
+    with _cerrojo:
+        if _configuracion['ruta'] == '-':
+            sys.stderr.write(linea)
+        else:
+            with open(_configuracion['ruta'], 'a') as fichero:
+                fichero.write(linea)
+
+'''
+@param campos: valores que se añaden a la medida de la etapa que se esta ejecutando (por ejemplo filasEliminadas)
+@description Si la medicion esta desactivada o no hay ninguna etapa en marcha en este hilo no hace nada
+'''
+def anotar(**campos):
+    if _configuracion is not None and _pila():
+        _pila()[-1].update(campos)
+
+'''
+@param string nombre: nombre de la etapa
+@param entrada: objeto que recibe la etapa, para contar sus filas
+@description Contexto que mide una etapa
+'''
+@contextmanager
+def _medirEtapa(nombre, entrada):
+    medida = {'etapa': nombre, 'pid': os.getpid(), 'filasEntrada': _filas(entrada)}
+    pila = _pila()
+    pila.append(medida)
+
+    perfil = cProfile.Profile() if _configuracion['perfil'] == nombre else None
+    memoria, inicio = memoriaResidente(), time.perf_counter()
+
+    if perfil is not None:
+        perfil.enable()
+
+    try:
+        yield medida
+
+    finally:
+        if perfil is not None:
+            perfil.disable()
+            perfil.dump_stats(nombre + '.prof')
+
+        medida['segundos'] = round(time.perf_counter() - inicio, 6)
+        final = memoriaResidente()
+        medida['memoriaMb'] = None if final is None else round(final, 1)
+        medida['deltaMemoriaMb'] = None if final is None or memoria is None else round(final - memoria, 1)
+
+        pila.pop()
+        _emitir(medida)
+
+'''
+@param string nombre: nombre de la etapa
+@param entrada: objeto que recibe la etapa, para contar sus filas
+@description Contexto para medir un trozo de una funcion (por ejemplo la limpieza de los precios). Si la medicion esta
+            desactivada devuelve un contexto vacio
+'''
+def etapa(nombre, entrada = None):
+    if _configuracion is None:
+        return nullcontext()
+
+    return _medirEtapa(nombre, entrada)
+
+'''
+@param funcion: funcion a medir
+@description Decorador que mide cada llamada a la funcion como una etapa con el nombre modulo.funcion. Las filas de entrada
+            son las del primer argumento y las de salida las del resultado. Si la medicion esta desactivada solo cuesta
+            comprobarlo antes de llamar a la funcion
+'''
+def medir(funcion):
+    nombre = funcion.__module__ + '.' + funcion.__qualname__
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        if _configuracion is None:
+            return funcion(*args, **kwargs)
+
+        with _medirEtapa(nombre, args[0] if args else None) as medida:
+            resultado = funcion(*args, **kwargs)
+            medida['filasSalida'] = _filas(resultado)
+
+        return resultado
+
+    return envoltura
+
+# Activamos la medicion si se ha pedido con las variables de entorno
+if os.environ.get('AIRBNB_METRICAS'):
+    activar(os.environ['AIRBNB_METRICAS'], os.environ.get('AIRBNB_PERFIL'))
@@ -0,0 +1,121 @@
+'''
+@company USC ETSE
+@description Procesar muchos ficheros de alojamientos (varias ciudades o varias fechas) a la vez, repartiendo los ficheros
+            entre los nucleos del ordenador y juntando despues los resultados.
+'''
+
+import glob
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import functions
+import functionsPandas
+
+'''
+@param rutas: ruta, patron glob (por ejemplo 'datos/*.csv') o lista de rutas y patrones
+@description Expande los patrones glob y quita las rutas repetidas manteniendo el orden
+@return lista con las rutas de los ficheros
+'''
+def _expandirRutas(rutas):
+    if isinstance(rutas, str):
+        rutas = [rutas]
+
+    ficheros = []
+
+    for ruta in rutas:
+        # Si el patron no encuentra nada dejamos la ruta tal cual para que al leerla salte FileNotFoundError
+        for fichero in sorted(glob.glob(ruta)) or [ruta]:
+            if fichero not in ficheros:
+                ficheros.append(fichero)
+
+    return ficheros
+
+'''
+@param string ruta: ruta del fichero de alojamientos
+@description Calcula en un proceso del pool los agregados de un fichero: alojamientosDistritos y landlords con la tabla
+            columnar de functions.py, y mediaAlojamientosDistrito y tiposAlojamientoDistrito con el data frame de
+            functionsPandas.py. Ademas devuelve los conteos con los que se pueden juntar los porcentajes y las medias de
+            varios ficheros.
+@return diccionario con los agregados del fichero
+'''
+def _procesarFichero(ruta):
+
+    tabla = functions.leerTabla(ruta)
+    data = functionsPandas.cargarAlojamientos(ruta)
+
+    # Para la media de alojamientos por anfitrion necesitamos cuantos alojamientos y cuantos anfitriones hay en cada distrito
+    porDistrito = data.groupby('distrito', observed = True).propietario.agg(['size', 'nunique'])
+
+    return {
+        'alojamientosDistritos': functions.alojamientosDistritos(tabla),
+        'landlords': functions.landlords(tabla),
+        'mediaAlojamientosDistrito': functionsPandas.mediaAlojamientosDistrito(data),
+        'tiposAlojamientoDistrito': functionsPandas.tiposAlojamientoDistrito(data, list(data.distrito.unique())),
+        'conteoTipos': data.tipo_alojamiento.value_counts(),
+        'alojamientosPorDistrito': porDistrito['size'],
+        'anfitrionesPorDistrito': porDistrito['nunique']
+    }
+
+'''
+@param list parciales: lista con los agregados de cada fichero (_procesarFichero)
+@description Junta los agregados de varios ficheros. Los conteos se suman; los porcentajes de tipos se recalculan con
+            los conteos sumados, y la media de alojamientos por anfitrion se calcula como el total de alojamientos entre
+            el total de anfitriones de cada distrito (un anfitrion que aparece en dos ficheros cuenta dos veces)
+@return diccionario con los agregados de todos los ficheros juntos
+'''
+def _juntar(parciales):
+
+    distritos, propietarios = Counter(), Counter()
+    tipos, alojamientos, anfitriones = pd.Series(dtype = 'int64'), pd.Series(dtype = 'int64'), pd.Series(dtype = 'int64')
+
+    for parcial in parciales:
+        distritos.update(parcial['alojamientosDistritos'])
+        propietarios.update(parcial['landlords'])
+
+        # Los indices son categorias de cada fichero, los pasamos a texto para poder juntar ficheros con categorias distintas
+        tipos = tipos.add(parcial['conteoTipos'].rename(index = str), fill_value = 0)
+        alojamientos = alojamientos.add(parcial['alojamientosPorDistrito'].rename(index = str), fill_value = 0)
+        anfitriones = anfitriones.add(parcial['anfitrionesPorDistrito'].rename(index = str), fill_value = 0)
+
+    tipos = tipos[tipos > 0].sort_values(ascending = False)
+
+    return {
+        'alojamientosDistritos': dict(distritos),
+        'landlords': dict(propietarios),
+        'mediaAlojamientosDistrito': round(alojamientos / anfitriones, 6),
+        'tiposAlojamientoDistrito': tipos / tipos.sum() * 100
+    }
+
+'''
+@param rutas: ruta, patron glob o lista de rutas y patrones de ficheros de alojamientos
+@param int procesos: numero de procesos del pool, por defecto uno por nucleo
+@description Procesa cada fichero en un proceso distinto con un ProcessPoolExecutor y junta los resultados
+@return diccionario con los agregados de todos los ficheros juntos ('total') y los de cada fichero ('ficheros', con la
+        ruta como clave)
+'''
+def procesarFicheros(rutas, procesos = None):
+
+    ficheros = _expandirRutas(rutas)
+
+    # No tiene sentido arrancar mas procesos que ficheros
+    procesos = min(procesos or os.cpu_count() or 1, len(ficheros)) or 1
+
+    with ProcessPoolExecutor(max_workers = procesos) as pool:
+        parciales = list(pool.map(_procesarFichero, ficheros))
+
+    return {'total': _juntar(parciales), 'ficheros': dict(zip(ficheros, parciales))}
+
+if __name__ == '__main__':
+    try:
+        resultado = procesarFicheros(sys.argv[1:] or [functionsPandas.FICHERO])
+
+    except FileNotFoundError as error:
+        print('ERROR: File not found', error.filename)
+
+    else:
+        print('SUCCESS: %d ficheros procesados' % len(resultado['ficheros']))
+        print(resultado['total']['mediaAlojamientosDistrito'])
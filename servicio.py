@@ -0,0 +1,240 @@
+'''
+@company USC ETSE
+@description Servicio HTTP local que lee el fichero de alojamientos una sola vez y responde en JSON a las consultas de
+            functions.py y functionsPandas.py, guardando las respuestas ya calculadas y volviendo a leer el fichero
+            cuando cambia. Por ejemplo: python servicio.py 8000 y despues
+            http://localhost:8000/alojamientosBaratos?distrito=Centro&cant=10
+'''
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import functions
+import functionsPandas
+
+# Cada cuantos segundos como mucho se comprueba si el fichero ha cambiado
+INTERVALO_RECARGA = 1.0
+
+# Numero maximo de respuestas guardadas, cuando se llena se quita la que hace mas tiempo que no se usa
+TAMANO_CACHE = 1024
+
+'''
+@param string ruta: ruta del fichero de alojamientos
+@description Datos que usan las consultas, leidos una sola vez: la tabla columnar de functions.py y el data frame de
+            functionsPandas.py con su indice y sus estadisticas por distrito. Tambien guarda las ultimas TAMANO_CACHE
+            respuestas calculadas
+'''
+class DatosServicio:
+
+    def __init__(self, ruta):
+        estado = os.stat(ruta)
+        self.firma = (estado.st_size, estado.st_mtime_ns)
+
+        self.tabla = functions.leerTabla(ruta)
+        self.data = functionsPandas.cargarAlojamientos(ruta)
+        self.indice = functionsPandas.IndiceAlojamientos(self.data)
+        self.estadisticas = functionsPandas.EstadisticasDistritos(self.data)
+
+        # Respuestas ya calculadas por consulta y argumentos, de la menos a la mas usada recientemente
+        self.respuestas = OrderedDict()
+        self.cerrojo = threading.Lock()
+
+    '''
+    @param clave: consulta y argumentos
+    @return la respuesta guardada para la clave, o None si no esta
+    '''
+    def respuesta(self, clave):
+        with self.cerrojo:
+            respuesta = self.respuestas.get(clave)
+            if respuesta is not None:
+                self.respuestas.move_to_end(clave)
+
+            return respuesta
+
+    '''
+    @param clave: consulta y argumentos
+    @param bytes respuesta: respuesta en JSON
+    @description Guarda la respuesta y si hay mas de TAMANO_CACHE quita la que hace mas tiempo que no se usa
+    '''
+    def guardar(self, clave, respuesta):
+        with self.cerrojo:
+            self.respuestas[clave] = respuesta
+            self.respuestas.move_to_end(clave)
+
+            if len(self.respuestas) > TAMANO_CACHE:
+                self.respuestas.popitem(last = False)
+
+'''
+@param dict parametros: parametros de la consulta (parse_qs)
+@param string nombre: nombre del parametro
+@return el valor del parametro, si no esta salta ValueError
+'''
+def _parametro(parametros, nombre):
+    if nombre not in parametros:
+        raise ValueError('Falta el parametro ' + nombre)
+
+    return parametros[nombre][0]
+
+'''
+@param dict parametros: parametros de la consulta (parse_qs)
+@return lista de distritos, que pueden venir repetidos (distritos=Centro&distritos=Retiro) o separados por comas
+'''
+def _distritos(parametros):
+    return [distrito for valor in parametros.get('distritos', []) for distrito in valor.split(',') if distrito]
+
+'''
+@param Series serie: serie de pandas
+@return diccionario con las claves como texto para poder pasarlo a JSON
+'''
+def _diccionario(serie):
+    return {str(clave): valor.item() if hasattr(valor, 'item') else valor for clave, valor in serie.items()}
+
+# Consultas del servicio: cada una tiene una funcion que saca de los parametros solo los argumentos que usa (asi los
+# parametros que sobran no cambian la respuesta guardada) y otra que recibe los datos y esos argumentos y devuelve algo que
+# se puede pasar a JSON
+CONSULTAS = {
+    'alojamientosDistritos': (lambda parametros: (), lambda datos: functions.alojamientosDistritos(datos.tabla)),
+    'disponibilidadAlojamiento': (lambda parametros: (int(_parametro(parametros, 'ocupantes')),),
+                                  lambda datos, ocupantes: list(functions.disponibilidadAlojamiento(datos.tabla, ocupantes))),
+    'alojamientosBaratos': (lambda parametros: (_parametro(parametros, 'distrito'), int(parametros.get('cant', ['10'])[0])),
+                            lambda datos, distrito, cant: list(functions.alojamientosBaratos(datos.tabla, distrito, cant))),
+    'landlords': (lambda parametros: (), lambda datos: functions.landlords(datos.tabla)),
+    'tiposAlojamientoDistrito': (lambda parametros: (tuple(_distritos(parametros)),),
+                                 lambda datos, distritos: _diccionario(functionsPandas.tiposAlojamientoDistrito(datos.indice, list(distritos)))),
+    'mediaAlojamientosDistrito': (lambda parametros: (), lambda datos: _diccionario(functionsPandas.mediaAlojamientosDistrito(datos.estadisticas)))
+}
+
+'''
+@param string ruta: ruta del fichero de alojamientos
+@description Servicio con los datos del fichero. Los datos se sustituyen enteros al recargar, de tal manera que una
+            consulta que ya ha empezado termina con los datos con los que empezo
+'''
+class ServicioAlojamientos:
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.datos = DatosServicio(ruta)
+        self.ultimaComprobacion = time.monotonic()
+        self.cerrojo = threading.Lock()
+
+        # Firma de la ultima version del fichero que no se pudo leer, para no intentarlo otra vez hasta que vuelva a cambiar
+        self.firmaFallida = None
+
+    '''
+    @description Si ha pasado INTERVALO_RECARGA desde la ultima comprobacion y el fichero ha cambiado de tamaño o de fecha,
+                vuelve a leerlo. Solo un hilo recarga, el resto siguen respondiendo con los datos anteriores. Si el fichero
+                nuevo no se puede leer se siguen usando los datos anteriores y no se vuelve a intentar hasta que cambie otra vez
+    @return los datos actuales
+    '''
+    def _datos(self):
+        ahora = time.monotonic()
+
+        if ahora - self.ultimaComprobacion >= INTERVALO_RECARGA and self.cerrojo.acquire(blocking = False):
+            try:
+                self.ultimaComprobacion = ahora
+                estado = os.stat(self.ruta)
+                firma = (estado.st_size, estado.st_mtime_ns)
+
+                if firma != self.datos.firma and firma != self.firmaFallida:
+                    try:
+                        self.datos = DatosServicio(self.ruta)
+                        print('SUCCESS: Fichero recargado')
+
+                    except Exception as error:
+                        # Cualquier error al leer el fichero nuevo (por ejemplo un fichero a medio escribir o con otro
+                        # formato) no debe llegar a las consultas
+                        self.firmaFallida = firma
+                        print('ERROR: No se pudo recargar el fichero, se siguen usando los datos anteriores: %r' % error)
+
+            except OSError:
+                # Si el fichero no existe en este momento (por ejemplo se esta reemplazando) seguimos con los datos anteriores
+                pass
+
+            finally:
+                self.cerrojo.release()
+
+        return self.datos
+
+    '''
+    @param string consulta: nombre de la consulta
+    @param dict parametros: parametros de la consulta (parse_qs)
+    @description Si la consulta con los mismos argumentos ya se ha hecho devuelve la respuesta guardada
+    @return respuesta en JSON (bytes)
+    '''
+    def responder(self, consulta, parametros):
+        datos = self._datos()
+        argumentos, funcion = CONSULTAS[consulta]
+        clave = (consulta, argumentos(parametros))
+
+        respuesta = datos.respuesta(clave)
+        if respuesta is None:
+            respuesta = json.dumps(funcion(datos, *clave[1]), ensure_ascii = False).encode('utf-8')
+            datos.guardar(clave, respuesta)
+
+        return respuesta
+
+'''
+@param ServicioAlojamientos servicio: servicio que responde las consultas
+@return clase que atiende las peticiones HTTP con ese servicio
+'''
+def _manejador(servicio):
+
+    class Manejador(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            consulta = url.path.strip('/')
+
+            if consulta not in CONSULTAS:
+                return self._enviar(404, json.dumps({'error': 'Consulta desconocida: ' + consulta}).encode('utf-8'))
+
+            try:
+                respuesta = servicio.responder(consulta, parse_qs(url.query))
+            except ValueError as error:
+                return self._enviar(400, json.dumps({'error': str(error)}, ensure_ascii = False).encode('utf-8'))
+
+            self._enviar(200, respuesta)
+
+        def _enviar(self, codigo, cuerpo):
+            self.send_response(codigo)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        # No escribimos una linea por peticion
+        def log_message(self, formato, *args):
+            pass
+
+    return Manejador
+
+'''
+@param string ruta: ruta del fichero de alojamientos
+@param string host: direccion en la que se escucha
+@param int puerto: puerto en el que se escucha
+@description Lee el fichero y arranca el servidor, que atiende cada peticion en un hilo
+@return el servidor (con serve_forever se empieza a atender peticiones)
+'''
+def crearServidor(ruta = functionsPandas.FICHERO, host = '127.0.0.1', puerto = 8000):
+    return ThreadingHTTPServer((host, puerto), _manejador(ServicioAlojamientos(ruta)))
+
+if __name__ == '__main__':
+    # python servicio.py [puerto] [fichero]
+    puerto = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    ruta = sys.argv[2] if len(sys.argv) > 2 else functionsPandas.FICHERO
+
+    try:
+        servidor = crearServidor(ruta, puerto = puerto)
+
+    except FileNotFoundError:
+        print('ERROR: File not found')
+        sys.exit(1)
+
+    print('SUCCESS: Servicio escuchando en http://127.0.0.1:%d' % puerto)
+    servidor.serve_forever()